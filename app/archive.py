@@ -0,0 +1,103 @@
+# Архив: старые выполненные задачи переезжают в planboard-archive.sqlite3 (ATTACH)
+
+import os
+from pathlib import Path
+
+from app.db import ALL_COLUMNS
+
+# Версия строки архиву не нужна (архивные задачи только читаются) — в UNION подставляется 0
+ARCHIVED_COLUMNS = ", ".join(c for c in ALL_COLUMNS if c != "version")
+
+ARCHIVE_ALIAS = "archive"
+DEFAULT_ARCHIVE_DAYS = 180
+BATCH_SIZE = 500
+
+ARCHIVE_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_ALIAS}.tasks (
+        id INTEGER PRIMARY KEY,
+        title TEXT NOT NULL,
+        description TEXT,
+        due_date TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        completed INTEGER NOT NULL DEFAULT 1,
+        priority INTEGER NOT NULL DEFAULT 0,
+        title_key TEXT NOT NULL DEFAULT '',
+        desc_preview TEXT NOT NULL DEFAULT '',
+        archived_at TEXT NOT NULL
+    )
+    """,
+    f"CREATE INDEX IF NOT EXISTS {ARCHIVE_ALIAS}.idx_archive_due ON tasks(due_date)",
+    f"""
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_ALIAS}.task_bodies (
+        task_id INTEGER PRIMARY KEY,
+        body BLOB NOT NULL,
+        zipped INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+]
+
+
+def archive_path_for(db_path):
+    # Рядом с основной БД: planboard.sqlite3 -> planboard-archive.sqlite3
+    root, ext = os.path.splitext(str(db_path))
+    return f"{root}-archive{ext or '.sqlite3'}"
+
+
+def is_attached(conn, alias=ARCHIVE_ALIAS):
+    return any(r[1] == alias for r in conn.execute("PRAGMA database_list"))
+
+
+def attach_archive(conn, path, read_only=False):
+    """
+    Подключает архив к соединению (вне транзакции). Для read-only соединений
+    архив должен уже существовать — иначе возвращаем False.
+    """
+    if is_attached(conn):
+        return True
+    if read_only:
+        if not os.path.isfile(path):
+            return False
+        target = Path(path).resolve().as_uri() + "?mode=ro"
+    else:
+        target = path
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (target,))
+    return True
+
+
+def move_batch(cur, cutoff, limit=BATCH_SIZE):
+    """
+    Одна пачка: копируем задачи и тела в архив и удаляем из основной таблицы.
+    cutoff — по дате выполнения (completed_at); без неё (записано в обход TaskRepo) — по сроку.
+    Основная БД в WAL, поэтому атомарность между файлами не гарантирована:
+    сначала пишем в архив (INSERT OR REPLACE — повтор безопасен), потом удаляем.
+    """
+    cur.execute("""
+        SELECT id FROM main.tasks
+        WHERE completed = 1 AND COALESCE(completed_at, due_date) < ?
+        ORDER BY COALESCE(completed_at, due_date)
+        LIMIT ?
+    """, (cutoff, int(limit)))
+    ids = [r[0] for r in cur.fetchall()]
+    if not ids:
+        return []
+    marks = ", ".join("?" * len(ids))
+    cur.execute(f"""
+        INSERT OR REPLACE INTO {ARCHIVE_ALIAS}.tasks({ARCHIVED_COLUMNS}, archived_at)
+        SELECT {ARCHIVED_COLUMNS}, DATE('now') FROM main.tasks WHERE id IN ({marks})
+    """, ids)
+    cur.execute(f"""
+        INSERT OR REPLACE INTO {ARCHIVE_ALIAS}.task_bodies(task_id, body, zipped)
+        SELECT task_id, body, zipped FROM main.task_bodies WHERE task_id IN ({marks})
+    """, ids)
+    # Тела в main удалит триггер trg_tasks_ad_body
+    cur.execute(f"DELETE FROM main.tasks WHERE id IN ({marks})", ids)
+    return ids
+
+
+def prepare_archive(conn, path):
+    # Писатель: подключить (создав файл при необходимости) и завести схему архива
+    attach_archive(conn, path)
+    for stmt in ARCHIVE_DDL:
+        conn.execute(stmt)
+    conn.commit()
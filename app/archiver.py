@@ -0,0 +1,63 @@
+# Фоновая архивация: пачки в отдельном потоке, каждая — своя короткая транзакция писателя
+
+import time
+import datetime
+import threading
+from PyQt5 import QtCore
+
+from app import changes
+from app.archive import DEFAULT_ARCHIVE_DAYS, archive_path_for, prepare_archive, move_batch
+
+# Пауза между пачками — чтобы писатель не был занят подолгу
+BATCH_PAUSE_SEC = 0.05
+
+
+class Archiver(QtCore.QObject):
+    """
+    Удаление из основной таблицы записывается как обычное (changes.deleted) — модель, счётчики
+    и кэш выборок узнают о нём через шину изменений (ChangeBus), как о любой записи.
+    finished(сколько перенесено) — доставляется в GUI-поток.
+    """
+    finished = QtCore.pyqtSignal(int)
+
+    def __init__(self, repo, days=DEFAULT_ARCHIVE_DAYS, parent=None):
+        super().__init__(parent)
+        self.repo = repo
+        self.days = max(1, int(days))
+        self.path = archive_path_for(repo.path)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="PlanBoard-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        cutoff = (datetime.date.today() - datetime.timedelta(days=self.days)).isoformat()
+        total = 0
+        try:
+            with self.repo.db.write_lock:
+                prepare_archive(self.repo.conn, self.path)
+            while not self._stop.is_set():
+                with self.repo.transaction() as cur:
+                    ids = move_batch(cur, cutoff)
+                    if ids:
+                        self.repo._record(changes.deleted(ids))
+                if not ids:
+                    break
+                total += len(ids)
+                time.sleep(BATCH_PAUSE_SEC)
+        except Exception:
+            pass
+        self.finished.emit(total)
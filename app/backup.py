@@ -0,0 +1,177 @@
+# Резервные копии БД на ходу: sqlite3 backup API по шагам, проверка копии, ротация
+
+import os
+import re
+import time
+import sqlite3
+from pathlib import Path
+
+from app.archive import archive_path_for
+
+BACKUP_DIR_NAME = "backups"
+BACKUP_KEEP = 7
+# Страниц за шаг и пауза между шагами — писатель и читатели не ждут копирования подолгу
+BACKUP_PAGES = 256
+BACKUP_SLEEP_SEC = 0.01
+# Запись в исходную БД с другого соединения перезапускает копирование по шагам; после стольких
+# перезапусков копируем за один шаг (под замком писателя приложения)
+BACKUP_MAX_RESTARTS = 3
+# Отпечаток файлов БД на момент последней копии (рядом с копиями)
+STATE_SUFFIX = ".last-backup"
+
+# planboard-20250131-235959-s1234.sqlite3 (s — номер последнего изменения в журнале на момент копии)
+_NAME_RE = re.compile(r"^(?P<stem>.+)-(?P<stamp>\d{8}-\d{6})-s(?P<seq>\d+)\.sqlite3$")
+
+
+def backup_dir_for(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), BACKUP_DIR_NAME)
+
+
+def _stem(db_path):
+    return Path(db_path).stem
+
+
+def list_backups(dest_dir, db_path):
+    """
+    Копии данной БД, от новых к старым: [(path, seq), ...].
+    """
+    stem = _stem(db_path)
+    found = []
+    try:
+        names = os.listdir(dest_dir)
+    except OSError:
+        return []
+    for name in names:
+        m = _NAME_RE.match(name)
+        if m and m.group("stem") == stem:
+            found.append((m.group("stamp"), int(m.group("seq")), os.path.join(dest_dir, name)))
+    found.sort(reverse=True)
+    return [(path, seq) for _, seq, path in found]
+
+
+def last_backup_seq(dest_dir, db_path):
+    backups = list_backups(dest_dir, db_path)
+    return backups[0][1] if backups else None
+
+
+def fingerprint(db_path):
+    """
+    Размеры и время изменения файлов БД, её WAL и архива. Любой коммит (в том числе
+    сохранённых видов и записей в обход журнала task_changes) меняет WAL или сам файл.
+    """
+    parts = []
+    paths = [db_path, archive_path_for(db_path)]
+    for path in paths + [p + "-wal" for p in paths]:
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_size}:{st.st_mtime_ns}")
+        except OSError:
+            parts.append("-")
+    return "|".join(parts)
+
+
+def _state_path(dest_dir, db_path):
+    return os.path.join(dest_dir, _stem(db_path) + STATE_SUFFIX)
+
+
+def needs_backup(dest_dir, db_path, state=None):
+    # Копий нет вовсе — делаем; иначе только если файлы БД изменились с прошлой копии
+    if not list_backups(dest_dir, db_path):
+        return True
+    try:
+        with open(_state_path(dest_dir, db_path), encoding="utf-8") as f:
+            last = f.read().strip()
+    except OSError:
+        return True
+    return last != (state or fingerprint(db_path))
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _restart_guard(limit):
+    # progress(status, remaining, total): осталось больше, чем на прошлом шаге, — копирование началось заново
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > limit:
+                # Исключение из progress прерывает backup()
+                raise _TooManyRestarts()
+        state["remaining"] = remaining
+    return progress
+
+
+def copy_db(src_path, dest_path, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP_SEC, lock=None):
+    """
+    Копирует живую БД в dest_path через backup API и проверяет копию integrity_check.
+    Пишем во временный файл — в dest_path попадает только проверенная копия.
+    По шагам — чтобы не держать чтение долго; если запись в БД раз за разом перезапускает
+    копирование, делаем его одним шагом (pages=-1), держа lock (замок писателя приложения).
+    """
+    part = dest_path + ".part"
+    if os.path.exists(part):
+        os.remove(part)
+    # Отдельное read-only соединение: общий писатель приложения не занимаем
+    src = sqlite3.connect(Path(src_path).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        dst = sqlite3.connect(part)
+        try:
+            try:
+                src.backup(dst, pages=pages, sleep=sleep, progress=_restart_guard(BACKUP_MAX_RESTARTS))
+            except _TooManyRestarts:
+                if lock is None:
+                    src.backup(dst, pages=-1)
+                else:
+                    with lock:
+                        src.backup(dst, pages=-1)
+            # Копия — обычный файл без WAL, чтобы её можно было просто скопировать/открыть
+            dst.execute("PRAGMA journal_mode = DELETE").fetchall()
+            result = dst.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    if result != "ok":
+        os.remove(part)
+        raise sqlite3.DatabaseError(f"backup integrity_check failed: {result}")
+    os.replace(part, dest_path)
+    return dest_path
+
+
+def rotate(dest_dir, db_path, keep=BACKUP_KEEP):
+    removed = []
+    for path, _ in list_backups(dest_dir, db_path)[max(1, int(keep)):]:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except OSError:
+            pass
+    return removed
+
+
+def backup_all(db_path, seq, dest_dir=None, keep=BACKUP_KEEP, pages=BACKUP_PAGES, sleep=BACKUP_SLEEP_SEC,
+               lock=None, state=None):
+    """
+    Копия основной БД (и архивной, если она есть) с пометкой seq + ротация.
+    state — отпечаток файлов (fingerprint), снятый до копирования: запоминается для needs_backup.
+    Возвращает список созданных файлов.
+    """
+    state = state or fingerprint(db_path)
+    dest_dir = dest_dir or backup_dir_for(db_path)
+    os.makedirs(dest_dir, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    made = []
+    sources = [db_path]
+    archive = archive_path_for(db_path)
+    if os.path.isfile(archive):
+        sources.append(archive)
+    for src in sources:
+        dest = os.path.join(dest_dir, f"{_stem(src)}-{stamp}-s{int(seq)}.sqlite3")
+        made.append(copy_db(src, dest, pages=pages, sleep=sleep, lock=lock))
+        rotate(dest_dir, src, keep=keep)
+    with open(_state_path(dest_dir, db_path), "w", encoding="utf-8") as f:
+        f.write(state)
+    return made
@@ -0,0 +1,49 @@
+# Фоновое резервное копирование: в отдельном потоке и только если БД менялась
+
+import logging
+import threading
+from PyQt5 import QtCore
+
+from app.backup import BACKUP_KEEP, backup_dir_for, needs_backup, backup_all, fingerprint
+
+log = logging.getLogger("planboard.backup")
+
+
+class BackupRunner(QtCore.QObject):
+    # Созданные файлы копий (пустой список — копировать было нечего или не вышло)
+    finished = QtCore.pyqtSignal(list)
+
+    def __init__(self, repo, keep=BACKUP_KEEP, parent=None):
+        super().__init__(parent)
+        self.repo = repo
+        self.keep = max(1, int(keep))
+        self.dest_dir = backup_dir_for(repo.path)
+        self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running():
+            return
+        self._thread = threading.Thread(target=self._run, name="PlanBoard-backup", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=2.0):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        made = []
+        try:
+            # Менялась ли БД — по файлам (ловит и правки вне журнала task_changes, например виды);
+            # номер последнего изменения журнала — только пометка в имени копии
+            state = fingerprint(self.repo.path)
+            if needs_backup(self.dest_dir, self.repo.path, state):
+                seq = self.repo.last_change_seq()
+                made = backup_all(self.repo.path, seq, dest_dir=self.dest_dir, keep=self.keep,
+                                  lock=self.repo.db.write_lock, state=state)
+                log.info("backup done: %s", ", ".join(made))
+        except Exception:
+            log.exception("backup failed")
+        self.finished.emit(made)
@@ -0,0 +1,75 @@
+# Qt-шина изменений: события TaskRepo -> сигналы для моделей и видов (в GUI-потоке)
+
+from PyQt5 import QtCore
+
+from app import changes
+
+# Как часто проверять PRAGMA data_version (изменения из других процессов)
+POLL_MS = 1000
+
+
+class ChangeBus(QtCore.QObject):
+    """
+    Один путь записи — через TaskRepo, много потребителей: каждый подписывается
+    на нужные сигналы и применяет только изменившееся.
+    Запись из рабочего потока доставляется подписчикам в их поток (queued).
+    """
+    taskInserted = QtCore.pyqtSignal(int)
+    # id задачи и имена изменённых полей
+    taskUpdated = QtCore.pyqtSignal(int, list)
+    tasksDeleted = QtCore.pyqtSignal(list)
+    # Изменения из другого процесса/скрипта: состав неизвестен, сверяться по журналу
+    bulkChanged = QtCore.pyqtSignal()
+    # Любое событие целиком (ChangeEvent) — для тех, кому удобнее один обработчик
+    changed = QtCore.pyqtSignal(object)
+
+    def __init__(self, repo, poll_ms=POLL_MS, parent=None):
+        super().__init__(parent)
+        self.repo = repo
+        repo.subscribe(self._on_event)
+
+        # Сверка с журналом при чужих изменениях: вызывается до bulkChanged,
+        # исключение оставляет версию прежней — следующий опрос повторит сверку
+        self._sync = None
+        self._seen_data_version = repo.data_version()
+        self._poll_timer = QtCore.QTimer(self)
+        self._poll_timer.setInterval(int(poll_ms))
+        self._poll_timer.timeout.connect(self._poll)
+        self._poll_timer.start()
+
+    def set_sync(self, sync):
+        self._sync = sync
+
+    def close(self):
+        self._poll_timer.stop()
+        self.repo.unsubscribe(self._on_event)
+
+    def _on_event(self, event):
+        if event.kind == changes.INSERTED:
+            for task_id in event.task_ids:
+                self.taskInserted.emit(task_id)
+        elif event.kind == changes.UPDATED:
+            for task_id in event.task_ids:
+                self.taskUpdated.emit(task_id, list(event.fields))
+        elif event.kind == changes.DELETED:
+            self.tasksDeleted.emit(list(event.task_ids))
+        elif event.kind == changes.BULK:
+            self.bulkChanged.emit()
+        self.changed.emit(event)
+
+    def _poll(self):
+        # Свои коммиты data_version не меняют — сюда попадают только чужие
+        try:
+            ver = self.repo.data_version()
+        except Exception:
+            return
+        if ver == self._seen_data_version:
+            return
+        if self._sync is not None:
+            try:
+                self._sync()
+            except Exception:
+                return
+        # Версию запоминаем только после успешной сверки, иначе чужие правки потеряются
+        self._seen_data_version = ver
+        self.repo.publish(changes.bulk())
@@ -0,0 +1,28 @@
+# События изменения задач: TaskRepo публикует их после коммита, подписчики применяют точечно
+
+from collections import namedtuple
+
+INSERTED = "inserted"
+UPDATED = "updated"
+DELETED = "deleted"
+# Изменения неизвестного состава (другой процесс/скрипт) — подписчик сверяется с журналом сам
+BULK = "bulk"
+
+# task_ids — кортеж id; fields — изменённые поля (только для UPDATED), иначе пустой кортеж
+ChangeEvent = namedtuple("ChangeEvent", "kind task_ids fields")
+
+
+def inserted(task_id):
+    return ChangeEvent(INSERTED, (task_id,), ())
+
+
+def updated(task_id, fields):
+    return ChangeEvent(UPDATED, (task_id,), tuple(fields))
+
+
+def deleted(task_ids):
+    return ChangeEvent(DELETED, tuple(task_ids), ())
+
+
+def bulk():
+    return ChangeEvent(BULK, (), ())
@@ -0,0 +1,59 @@
+# Команды командной строки: python -m app.main add "Название" --due 2025-01-31 --priority 3
+
+import argparse
+import datetime
+
+COMMANDS = ("add",)
+
+
+class CommandError(ValueError):
+    """Команда указана, но разобрать её нельзя (текст — что не так)."""
+
+
+class _Parser(argparse.ArgumentParser):
+    # Ошибку разбора отдаём вызывающему, а не печатаем и не завершаем процесс
+    def error(self, message):
+        raise CommandError(message)
+
+
+def _make_parser():
+    p = _Parser(prog="PlanBoard", add_help=True)
+    sub = p.add_subparsers(dest="command")
+    add = sub.add_parser("add", help="Добавить задачу")
+    add.add_argument("title")
+    add.add_argument("--desc", "-d", default="")
+    add.add_argument("--due", default=None, help="Срок в формате YYYY-MM-DD (по умолчанию сегодня)")
+    add.add_argument("--priority", "-p", type=int, default=0)
+    return p
+
+
+def parse_command(argv):
+    """
+    Разбирает argv (без имени программы). Возвращает Namespace с command
+    или None, если команды нет (обычный запуск). Некорректная команда — CommandError.
+    """
+    argv = [a for a in (argv or []) if a]
+    if not argv or argv[0] not in COMMANDS:
+        return None
+    ns = _make_parser().parse_args(argv)
+    if ns.command == "add":
+        due = ns.due or datetime.date.today().isoformat()
+        try:
+            datetime.date.fromisoformat(due)
+        except Exception:
+            raise CommandError(f"неверный срок --due {due!r}: нужен формат YYYY-MM-DD")
+        ns.due = due
+        ns.priority = max(0, min(10, int(ns.priority)))
+        ns.title = (ns.title or "").strip()
+        if not ns.title:
+            raise CommandError("пустое название задачи")
+    return ns
+
+
+def apply_command(repo, cmd):
+    # Применяет разобранную команду к репозиторию; возвращает id затронутой задачи
+    if cmd is None:
+        return None
+    if cmd.command == "add":
+        return repo.add_task(cmd.title, cmd.desc, cmd.due, cmd.priority)
+    return None
@@ -1,5 +1,6 @@
 # инициализация Б/Д
 
+import zlib
 import sqlite3
 from app.paths import db_path  # хранение БД в %APPDATA%\PlanBoard
 
@@ -16,14 +17,304 @@ CREATE TABLE IF NOT EXISTS tasks (
 
 CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(due_date);
 CREATE INDEX IF NOT EXISTS idx_tasks_completed ON tasks(completed);
+-- Под ORDER BY при сортировке на стороне БД (rowid в индексе — готовый тай-брейк по id)
+CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority);
+CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks(created_at);
+
+-- Журнал изменений: заполняется триггерами, читается другими процессами/окнами
+CREATE TABLE IF NOT EXISTS task_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id INTEGER NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D'))
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_ai AFTER INSERT ON tasks BEGIN
+    INSERT INTO task_changes(task_id, op) VALUES (NEW.id, 'I');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_au AFTER UPDATE ON tasks BEGIN
+    INSERT INTO task_changes(task_id, op) VALUES (NEW.id, 'U');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tasks_ad AFTER DELETE ON tasks BEGIN
+    INSERT INTO task_changes(task_id, op) VALUES (OLD.id, 'D');
+END;
+"""
+
+# Сколько последних записей журнала изменений держим
+CHANGES_KEEP = 5000
+
+# Колонки задачи (после всех миграций), которые отдаёт репозиторий
+ALL_COLUMNS = ("id", "title", "description", "due_date", "created_at", "completed", "priority", "title_key",
+               "desc_preview", "version")
+TASK_COLUMNS = ", ".join(ALL_COLUMNS)
+
+
+def fold_key(text):
+    """
+    Ключ для поиска/сортировки названий: casefold + ё→е.
+    SQLite LOWER/LIKE/NOCASE кириллицу не сворачивают, поэтому считаем в Python
+    и храним готовым в tasks.title_key.
+    """
+    return (text or "").casefold().replace("ё", "е")
+
+
+# ===== Описание: короткое превью в tasks, полный длинный текст — в task_bodies =====
+PREVIEW_CHARS = 160
+PREVIEW_LINES = 3
+# Тела длиннее этого сжимаем zlib
+COMPRESS_MIN_BYTES = 1024
+
+
+def make_preview(text):
+    text = text or ""
+    lines = text.splitlines()
+    cut = "\n".join(lines[:PREVIEW_LINES])
+    if len(cut) > PREVIEW_CHARS:
+        cut = cut[:PREVIEW_CHARS]
+    if cut != text:
+        cut = cut.rstrip() + "…"
+    return cut
+
+
+def split_description(text):
+    """
+    Раскладывает описание по хранилищам: (tasks.description, tasks.desc_preview, тело или None).
+    Короткий текст целиком остаётся в tasks, длинный уходит в task_bodies,
+    а tasks.description для него NULL — чтобы не тянуть overflow-страницы при сканах tasks.
+    """
+    text = text or ""
+    preview = make_preview(text)
+    if preview == text:
+        return text, preview, None
+    return None, preview, text
+
+
+def pack_body(text):
+    raw = (text or "").encode("utf-8")
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        return zlib.compress(raw), 1
+    return raw, 0
+
+
+def unpack_body(blob, zipped):
+    if blob is None:
+        return None
+    raw = zlib.decompress(blob) if zipped else bytes(blob)
+    return raw.decode("utf-8")
+
+
+# ===== Миграции (номер схемы — PRAGMA user_version) =====
+def _has_column(conn, table, column):
+    return any(r[1] == column for r in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _migrate_1_title_key(conn):
+    if not _has_column(conn, "tasks", "title_key"):
+        conn.execute("ALTER TABLE tasks ADD COLUMN title_key TEXT NOT NULL DEFAULT ''")
+    conn.execute("UPDATE tasks SET title_key = pb_fold_key(title)")
+    conn.execute("DROP INDEX IF EXISTS idx_tasks_title_nocase")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_title_key ON tasks(title_key)")
+
+
+# Вставка в обход TaskRepo (скрипты): превью из описания. Пустое описание не трогаем —
+# иначе каждая add_task без описания делала бы лишний UPDATE (+1 к версии и запись в журнал)
+_AI_PREVIEW_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS trg_tasks_ai_preview AFTER INSERT ON tasks
+    WHEN NEW.description IS NOT NULL AND NEW.description <> '' AND NEW.desc_preview = '' BEGIN
+        UPDATE tasks SET desc_preview = substr(NEW.description, 1, {PREVIEW_CHARS}) WHERE id = NEW.id;
+    END
 """
 
-def init_db():
-    path = db_path()
+
+def _migrate_2_desc_bodies(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS task_bodies (
+            task_id INTEGER PRIMARY KEY,
+            body BLOB NOT NULL,
+            zipped INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    if not _has_column(conn, "tasks", "desc_preview"):
+        conn.execute("ALTER TABLE tasks ADD COLUMN desc_preview TEXT NOT NULL DEFAULT ''")
+    rows = conn.execute("SELECT id, description FROM tasks WHERE description IS NOT NULL AND description <> ''").fetchall()
+    for task_id, text in rows:
+        desc, preview, body = split_description(text)
+        conn.execute("UPDATE tasks SET description = ?, desc_preview = ? WHERE id = ?", (desc, preview, task_id))
+        if body is not None:
+            blob, zipped = pack_body(body)
+            conn.execute("INSERT OR REPLACE INTO task_bodies(task_id, body, zipped) VALUES (?, ?, ?)",
+                         (task_id, blob, zipped))
+    # executescript здесь нельзя — он коммитит транзакцию миграции
+    # Удаление задачи уносит и тело (в том числе при записи в обход TaskRepo)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_ad_body AFTER DELETE ON tasks BEGIN
+            DELETE FROM task_bodies WHERE task_id = OLD.id;
+        END
+    """)
+    # Скрипты пишут описание прямо в tasks: старое тело больше не актуально, превью — по символам
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_desc_ext AFTER UPDATE OF description ON tasks
+        WHEN NEW.description IS NOT NULL BEGIN
+            DELETE FROM task_bodies WHERE task_id = NEW.id;
+            UPDATE tasks SET desc_preview = substr(NEW.description, 1, {PREVIEW_CHARS})
+            WHERE id = NEW.id AND desc_preview <> substr(NEW.description, 1, {PREVIEW_CHARS});
+        END
+    """)
+    conn.execute(_AI_PREVIEW_TRIGGER)
+
+
+def _migrate_3_row_version(conn):
+    # Версия строки для оптимистичной блокировки: UPDATE ... WHERE id = ? AND version = ?
+    if not _has_column(conn, "tasks", "version"):
+        conn.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    # TaskRepo увеличивает версию сам; запись в обход него (скрипты) — триггером
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_version AFTER UPDATE ON tasks
+        WHEN NEW.version = OLD.version BEGIN
+            UPDATE tasks SET version = OLD.version + 1 WHERE id = NEW.id;
+        END
+    """)
+
+
+def _migrate_4_query_indexes(conn):
+    # Запросы строки поиска (app/query.py): "done:no due<today" — один диапазон по составному индексу
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed_due ON tasks(completed, due_date)")
+
+
+def _migrate_5_saved_views(conn):
+    # Сохранённые виды: условие — запрос строки поиска (app/query.py), плюс сортировка по колонке
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS saved_views (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            query TEXT NOT NULL,
+            sort_key TEXT NOT NULL DEFAULT '',
+            sort_desc INTEGER NOT NULL DEFAULT 0,
+            position INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def _migrate_6_task_counts(conn):
+    # Агрегаты для строки состояния: сколько задач на каждую дату срока, отдельно открытых и выполненных.
+    # Строк столько, сколько разных дат, — счётчики читаются одним запросом без прохода по tasks
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS task_counts (
+            completed INTEGER NOT NULL,
+            due_date TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (completed, due_date)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("DELETE FROM task_counts")
+    conn.execute("""
+        INSERT INTO task_counts(completed, due_date, n)
+        SELECT completed <> 0, due_date, COUNT(*) FROM tasks GROUP BY completed <> 0, due_date
+    """)
+    # UPSERT (ON CONFLICT DO UPDATE) есть только с SQLite 3.24 — через INSERT OR IGNORE + UPDATE
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_counts_ai AFTER INSERT ON tasks BEGIN
+            INSERT OR IGNORE INTO task_counts(completed, due_date, n) VALUES (NEW.completed <> 0, NEW.due_date, 0);
+            UPDATE task_counts SET n = n + 1 WHERE completed = (NEW.completed <> 0) AND due_date = NEW.due_date;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_counts_ad AFTER DELETE ON tasks BEGIN
+            UPDATE task_counts SET n = n - 1 WHERE completed = (OLD.completed <> 0) AND due_date = OLD.due_date;
+            DELETE FROM task_counts WHERE completed = (OLD.completed <> 0) AND due_date = OLD.due_date AND n <= 0;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_counts_au AFTER UPDATE OF completed, due_date ON tasks
+        WHEN (OLD.completed <> 0) <> (NEW.completed <> 0) OR OLD.due_date <> NEW.due_date BEGIN
+            UPDATE task_counts SET n = n - 1 WHERE completed = (OLD.completed <> 0) AND due_date = OLD.due_date;
+            DELETE FROM task_counts WHERE completed = (OLD.completed <> 0) AND due_date = OLD.due_date AND n <= 0;
+            INSERT OR IGNORE INTO task_counts(completed, due_date, n) VALUES (NEW.completed <> 0, NEW.due_date, 0);
+            UPDATE task_counts SET n = n + 1 WHERE completed = (NEW.completed <> 0) AND due_date = NEW.due_date;
+        END
+    """)
+
+
+def _migrate_7_preview_trigger(conn):
+    # Базы с прежним триггером превью (срабатывал и на пустое описание) — пересоздаём
+    conn.execute("DROP TRIGGER IF EXISTS trg_tasks_ai_preview")
+    conn.execute(_AI_PREVIEW_TRIGGER)
+
+
+def _migrate_8_completed_at(conn):
+    # Дата выполнения (её ставит TaskRepo): по ней архивируются выполненные задачи, а не по сроку.
+    # Когда выполнены уже закрытые задачи, неизвестно — считаем, что сегодня (в архив уйдут не раньше срока хранения)
+    if not _has_column(conn, "tasks", "completed_at"):
+        conn.execute("ALTER TABLE tasks ADD COLUMN completed_at TEXT")
+    conn.execute("UPDATE tasks SET completed_at = DATE('now'), version = version + 1 "
+                 "WHERE completed = 1 AND completed_at IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_completed_at ON tasks(completed, completed_at)")
+
+
+MIGRATIONS = [
+    (1, _migrate_1_title_key),
+    (2, _migrate_2_desc_bodies),
+    (3, _migrate_3_row_version),
+    (4, _migrate_4_query_indexes),
+    (5, _migrate_5_saved_views),
+    (6, _migrate_6_task_counts),
+    (7, _migrate_7_preview_trigger),
+    (8, _migrate_8_completed_at),
+]
+
+
+def migrate(conn):
+    conn.create_function("pb_fold_key", 1, fold_key)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in MIGRATIONS:
+        if target <= version:
+            continue
+        # Каждая миграция — своя транзакция (вместе с DDL и номером версии)
+        conn.execute("BEGIN")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        version = target
+    # Строки, вставленные в обход TaskRepo (скрипты), получают ключ при следующем запуске
+    with conn:
+        conn.execute("UPDATE tasks SET title_key = pb_fold_key(title) WHERE title_key = '' AND title <> ''")
+
+
+def init_db(path=None, page_size=None, convert_page_size=False):
+    """
+    page_size — размер страницы новой БД. У существующей он меняется только полным VACUUM:
+    его делаем здесь, до открытия пула, и лишь при convert_page_size (профиль выбран явно) —
+    это может занять время на большой базе.
+    """
+    path = path or db_path()
     conn = sqlite3.connect(path)
     try:
+        # Размер страницы задаётся только до создания первой таблицы; дальше — через VACUUM
+        fresh = not conn.execute("PRAGMA page_count").fetchone()[0]
+        if page_size and fresh:
+            conn.execute(f"PRAGMA page_size = {int(page_size)}")
         conn.executescript(DDL)  # выполняем весь DDL разом
+        migrate(conn)
+        # Подрезаем журнал; отставшие читатели просто перезагрузятся целиком
+        conn.execute(
+            "DELETE FROM task_changes WHERE seq <= (SELECT MAX(seq) FROM task_changes) - ?",
+            (CHANGES_KEEP,),
+        )
         conn.commit()
+        if page_size and convert_page_size and not fresh and \
+                conn.execute("PRAGMA page_size").fetchone()[0] != int(page_size):
+            # В WAL размер страницы не меняется — на время VACUUM выходим из него
+            conn.execute("PRAGMA journal_mode = DELETE").fetchall()
+            conn.execute(f"PRAGMA page_size = {int(page_size)}")
+            try:
+                conn.execute("VACUUM")
+            finally:
+                conn.execute("PRAGMA journal_mode = WAL").fetchall()
     finally:
         conn.close()
 
@@ -0,0 +1,899 @@
+# Прокси фильтра/сортировки на готовых индексах: битовые множества по режимам + перестановки по колонкам.
+# В отличие от QSortFilterProxyModel, не зовёт Python на каждую строку при смене фильтра/сортировки.
+
+import datetime
+from itertools import compress
+from PyQt5 import QtCore
+
+from app.db import fold_key
+from app.trigram import TrigramIndex
+from app.result_cache import ResultCache
+
+# NumPy необязателен: с ним индексы очень больших досок строятся векторно
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# Режимы фильтра (как в выпадающем списке окна); индекс — номер битового множества
+MODES = ("Все", "Открытые", "Просроченные", "На сегодня", "Выполненные")
+# С какого числа строк имеет смысл NumPy (на маленьких списках накладные расходы больше выигрыша)
+NUMPY_MIN_ROWS = 20000
+# Предел буфера NumPy для поиска: строки там фиксированной ширины (строк × самая длинная × 4 байта)
+NUMPY_SEARCH_MAX_BYTES = 64 * 1024 * 1024
+# По сколько строк читать полные описания для поиска: в памяти одновременно только пачка
+SEARCH_CHUNK_ROWS = 2000
+
+
+def _and(a, b):
+    # Пересечение двух множеств-байтов (по байту 0/1 на строку) одной операцией над int
+    n = len(a)
+    return (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(n, "little")
+
+
+class _Identity:
+    # Карта «строка источника -> строка прокси» один к одному (оконный источник)
+    __slots__ = ("n",)
+
+    def __init__(self, n):
+        self.n = n
+
+    def get(self, row, default=None):
+        return row if 0 <= row < self.n else default
+
+
+class IndexedFilterProxy(QtCore.QAbstractProxyModel):
+    """
+    Для каждой строки источника один раз (при загрузке) считаются принадлежности
+    режимам фильтра — по байту в bytearray на режим; для сортировки по колонке —
+    перестановка номеров строк (строится при первой сортировке по ней).
+    Смена режима/поиска — пересечение множеств, смена сортировки — другая перестановка.
+    Изменения строк источника применяются точечно: вставка/удаление/перемещение одной строки.
+    Сохранённые виды (setViews) — такие же множества после MODES, с живыми счётчиками.
+    """
+    # Изменились счётчики строк по режимам/видам (count())
+    countsChanged = QtCore.pyqtSignal()
+
+    def __init__(self, source_model=None, parent=None):
+        super().__init__(parent)
+        self.mode = MODES[0]
+        # True — сортирует БД (ORDER BY по индексу), прокси сохраняет порядок источника
+        self.server_sort = False
+        # True — источник оконный (WindowedTaskModel): фильтр и сортировка в SQL,
+        # строки в памяти не все — прокси ничего не индексирует и отображает строки один к одному
+        self.passthrough = False
+        # Поиск по названию: свёрнутая строка (casefold + ё→е), сравниваем с title_key
+        self.search_key = ""
+        # Запрос строки поиска (Plan из app/query.py); вместо search_key, если задан
+        self.query = None
+        self._query_ids = None
+        # Триграммный индекс по названию и полному описанию (только триграммы, без текстов);
+        # строится при первом поиске, кандидатов проверяет по БД (_verify)
+        self._trigrams = None
+        self._id_rows = None
+        self._sort_column = -1
+        self._sort_order = QtCore.Qt.AscendingOrder
+        self._n = 0
+        self._today = datetime.date.today()
+        self._members = [bytearray() for _ in MODES]
+        # Сохранённые виды: [(ключ режима, Plan)]; их множества идут в _members после MODES
+        self._views = []
+        self._mode_keys = list(MODES)
+        # Сколько строк в каждом множестве (поддерживается точечно, без пересчёта)
+        self._counts = [0] * len(MODES)
+        self._search_bits = None
+        # Колонка -> номера строк источника по возрастанию ключа (тай-брейк по id)
+        self._perms = {}
+        # Видимые строки источника в порядке показа и обратное отображение (строится лениво)
+        self._visible = []
+        self._pos = None
+        # Готовые выборки (режим, поиск, сортировка, дата) -> строки. Действительны, пока не сменились
+        # счётчик изменений репозитория и своё поколение (_generation): оно растёт при смене состава
+        # строк источника и при правках, меняющих принадлежность, поиск или порядок, — не при догрузке
+        # колонок, подсказках и перекраске
+        self.result_cache = ResultCache()
+        self._generation = 0
+        # Векторный путь (если установлен NumPy); False — всегда чистый Python
+        self.use_numpy = np is not None
+        # Колонки строк массивами NumPy (id, completed, priority, due_date) — ведутся вместе с моделью;
+        # None — векторный путь выключен или данные в массивы не легли
+        self._np = None
+        if source_model is not None:
+            self.setSourceModel(source_model)
+
+    # ===== Источник =====
+    def setSourceModel(self, model):
+        old = self.sourceModel()
+        if old is not None:
+            for signal, slot in self._source_connections(old):
+                try:
+                    signal.disconnect(slot)
+                except Exception:
+                    pass
+        self.beginResetModel()
+        super().setSourceModel(model)
+        self.passthrough = bool(getattr(model, "windowed", False))
+        self._rebuild()
+        self.endResetModel()
+        if model is not None:
+            for signal, slot in self._source_connections(model):
+                signal.connect(slot)
+
+    def _source_connections(self, model):
+        return [
+            (model.modelAboutToBeReset, self.beginResetModel),
+            (model.modelReset, self._on_source_reset),
+            (model.dataChanged, self._on_source_data_changed),
+            (model.rowsInserted, self._on_source_rows_inserted),
+            (model.rowsAboutToBeRemoved, self._on_source_rows_about_to_be_removed),
+            (model.rowsRemoved, self._on_source_rows_removed),
+            (model.layoutChanged, self.invalidate),
+            (model.headerDataChanged, self.headerDataChanged),
+        ]
+
+    def _rows(self):
+        model = self.sourceModel()
+        return getattr(model, "rows", None) or []
+
+    def _value(self, row, key):
+        return self.sourceModel()._get_value(row, key)
+
+    # ===== Построение индексов =====
+    def _getter(self, row):
+        # Доступ к колонкам строки для Plan.matches
+        return lambda key: self._title_key(row) if key == "title_key" else self._value(row, key)
+
+    def _view_flags(self, row):
+        get = self._getter(row)
+        return tuple(int(plan.matches(get, self._today)) for _, plan in self._views)
+
+    def _flags(self, row):
+        # Принадлежность строки режимам MODES (0/1), затем сохранённым видам
+        completed = bool(self._value(row, "completed"))
+        due = self._value(row, "due_date")
+        try:
+            due_date = datetime.date.fromisoformat(str(due)) if due else None
+        except Exception:
+            due_date = None
+        today = self._today
+        open_ = not completed
+        flags = (
+            1,
+            int(open_),
+            int(open_ and due_date is not None and due_date < today),
+            int(open_ and due_date is not None and due_date == today),
+            int(completed),
+        )
+        return flags + self._view_flags(row) if self._views else flags
+
+    def _title_key(self, row):
+        return self._value(row, "title_key") or fold_key(self._value(row, "title"))
+
+    def _search_texts(self, rows):
+        """
+        Тексты для поиска (название + полное описание) по списку строк. Описание берётся
+        из строки, если оно там целиком, иначе — из БД одним запросом на пачку (длинные —
+        из task_bodies); превью — только если источник читать БД не умеет.
+        Тексты не запоминаются: зовущий держит их, пока проверяет пачку.
+        """
+        rows = list(rows)
+        missing = [self._value(r, "id") for r in rows if self._value(r, "description") is None]
+        load = getattr(self.sourceModel(), "search_bodies", None)
+        bodies = {}
+        if missing and load is not None:
+            try:
+                bodies = load(missing)
+            except Exception:
+                bodies = {}
+        texts = []
+        for r in rows:
+            desc = self._value(r, "description")
+            if desc is not None:
+                body = fold_key(desc)
+            else:
+                body = bodies.get(self._value(r, "id"))
+                if body is None:
+                    body = fold_key(self._value(r, "desc_preview"))
+            texts.append(self._title_key(r) + "\n" + body)
+        return texts
+
+    def _chunks(self, rows):
+        for i in range(0, len(rows), SEARCH_CHUNK_ROWS):
+            yield i, rows[i:i + SEARCH_CHUNK_ROWS]
+
+    def _matches(self, row):
+        if self.query is not None:
+            return self.query.matches(self._getter(row), self._today)
+        return self.search_key in self._search_texts([row])[0]
+
+    def _sort_key(self, column, row):
+        model = self.sourceModel()
+        key = model.COLUMNS[column][0] if 0 <= column < len(model.COLUMNS) else None
+        if key == "title":
+            val = self._title_key(row)
+        elif key == "description":
+            val = fold_key(self._value(row, "desc_preview") or self._value(row, "description"))
+        elif key in ("completed", "priority"):
+            try:
+                val = int(self._value(row, key) or 0)
+            except Exception:
+                val = 0
+        else:
+            val = self._value(row, key)
+            val = "" if val is None else str(val)
+        return (val, self._value(row, "id") or 0)
+
+    def _vectorized(self):
+        return self.use_numpy and np is not None and self._n >= NUMPY_MIN_ROWS
+
+    def _rebuild(self):
+        self._generation += 1
+        if self.passthrough:
+            self._rebuild_passthrough()
+            return
+        rows = self._rows()
+        self._n = len(rows)
+        self._today = datetime.date.today()
+        self._np = self._np_columns(rows) if self._vectorized() else None
+        members = self._np_members()
+        if members is not None:
+            views = [self._view_flags(r) for r in rows] if self._views else []
+            self._members = members + [bytearray(col) for col in zip(*views)]
+        else:
+            flags = [self._flags(r) for r in rows]
+            if flags:
+                self._members = [bytearray(col) for col in zip(*flags)]
+            else:
+                self._members = [bytearray() for _ in self._mode_keys]
+        # Полный подсчёт — только здесь; дальше счётчики правятся по изменённым строкам
+        self._counts = [bits.count(1) for bits in self._members]
+        self._trigrams = None
+        self._id_rows = None
+        self._rebuild_search()
+        self._perms = {}
+        self._visible = self._cached_visible()
+        self._pos = None
+        self.countsChanged.emit()
+
+    def _rebuild_passthrough(self):
+        self._n = self.sourceModel().rowCount()
+        self._today = datetime.date.today()
+        self._members = [bytearray() for _ in self._mode_keys]
+        self._counts = [0] * len(self._mode_keys)
+        self._search_bits = None
+        self._query_ids = None
+        self._trigrams = None
+        self._id_rows = None
+        self._np = None
+        self._perms = {}
+        self._visible = range(self._n)
+        self._pos = None
+        self.countsChanged.emit()
+
+    # ===== Векторный путь (NumPy) =====
+    # Колонки, которые сортируются по массивам (значение ключа то же, что в _sort_key)
+    NP_SORT_COLUMNS = ("due_date", "priority", "completed")
+
+    def _np_values(self, row):
+        return (self._value(row, "id") or 0, bool(self._value(row, "completed")),
+                int(self._value(row, "priority") or 0), self._value(row, "due_date") or "NaT")
+
+    def _np_columns(self, rows):
+        """
+        Массивы колонок по строкам источника. None — данные в массивы не ложатся
+        (кривая дата, нечисловой приоритет), тогда всё считается построчно.
+        """
+        try:
+            ids, completed, priority, due = zip(*map(self._np_values, rows)) if rows else ((),) * 4
+            return {
+                "id": np.array(ids, dtype=np.int64),
+                "completed": np.array(completed, dtype=bool),
+                "priority": np.array(priority, dtype=np.int64),
+                "due_date": np.array(due, dtype="datetime64[D]"),
+            }
+        except Exception:
+            return None
+
+    def _np_set(self, r, row):
+        # Строка изменилась — обновляем её элементы во всех массивах
+        if self._np is None:
+            return
+        try:
+            for key, value in zip(("id", "completed", "priority", "due_date"), self._np_values(row)):
+                self._np[key][r] = value
+        except Exception:
+            self._np = None
+
+    def _np_append(self, rows):
+        if self._np is None:
+            return
+        extra = self._np_columns(rows)
+        if extra is None:
+            self._np = None
+            return
+        self._np = {key: np.concatenate((arr, extra[key])) for key, arr in self._np.items()}
+
+    def _np_delete(self, first, last):
+        if self._np is not None:
+            self._np = {key: np.delete(arr, np.s_[first:last + 1]) for key, arr in self._np.items()}
+
+    def _np_members(self):
+        """
+        Режимы одной векторной операцией над массивами: дата срока (datetime64[D]) и флаг выполнения.
+        None — массивов нет, считаем построчно.
+        """
+        if self._np is None:
+            return None
+        completed = self._np["completed"]
+        due = self._np["due_date"]
+        today = np.datetime64(self._today.isoformat(), "D")
+        open_ = ~completed
+        masks = [
+            np.ones(len(completed), dtype=bool),
+            open_,
+            open_ & (due < today),
+            open_ & (due == today),
+            completed,
+        ]
+        return [bytearray(m.astype(np.uint8).tobytes()) for m in masks]
+
+    def _np_search(self, texts, key):
+        """
+        None — массив не строим: одна длинная строка (описание) раздула бы его целиком.
+        """
+        width = max(map(len, texts), default=0)
+        if len(texts) * width * 4 > NUMPY_SEARCH_MAX_BYTES:
+            return None
+        keys = np.array(texts, dtype=f"U{max(width, 1)}")
+        return bytearray((np.char.find(keys, key) >= 0).astype(np.uint8).tobytes())
+
+    def _np_perm(self, column, rows):
+        # lexsort: последний ключ — главный; порядок тот же, что у (значение, id) в _sort_key
+        model = self.sourceModel()
+        key = model.COLUMNS[column][0] if 0 <= column < len(model.COLUMNS) else None
+        cols = self._np
+        if cols is not None and key in self.NP_SORT_COLUMNS and len(cols["id"]) == len(rows):
+            values = cols[key]
+            # Пустой срок Python ставит первым (""), NumPy (NaT) — последним: такие сортируем построчно
+            if key != "due_date" or not np.isnat(values).any():
+                return np.lexsort((cols["id"], values)).tolist()
+        keys = [self._sort_key(column, r) for r in rows]
+        try:
+            values = np.array([k[0] for k in keys])
+            ids = np.array([k[1] for k in keys])
+            return np.lexsort((ids, values)).tolist()
+        except Exception:
+            return sorted(range(len(rows)), key=keys.__getitem__)
+
+    def _cache_generation(self):
+        repo = getattr(self.sourceModel(), "repo", None)
+        return (getattr(repo, "change_counter", 0), self._generation)
+
+    def _search_spec(self):
+        if self.query is not None:
+            return ("query", self.query.text)
+        return ("text", self.search_key) if self.search_key else None
+
+    def _rebuild_search(self):
+        spec = self._search_spec()
+        if spec is None or self.passthrough:
+            self._search_bits = None
+            self._query_ids = None
+            return
+        key = ("search", spec, self._today)
+        bits = self.result_cache.get(key, self._cache_generation())
+        if bits is None:
+            self._compute_search()
+            self.result_cache.put(key, self._search_bits, self._cache_generation())
+        else:
+            self._search_bits = bits
+            self._query_ids = None
+
+    def _compute_search(self):
+        if self.query is not None:
+            rows = self._rows()
+            ids, self._query_ids = self._query_ids, None
+            if ids is None:
+                self._search_bits = bytearray(self._matches(r) for r in rows)
+            else:
+                # Ответ БД по индексам; дальше строки проверяются точечно через query.matches
+                self._search_bits = bytearray(self._value(r, "id") in ids for r in rows)
+            return
+        if not self.search_key:
+            self._search_bits = None
+            return
+        key = self.search_key
+        rows = self._rows()
+        if len(key) >= 3:
+            # Кандидаты из триграммного индекса, проверка подстроки — только у них
+            hits = self._ensure_trigrams().search(key)
+            id_rows = self._id_row_map()
+            bits = bytearray(len(rows))
+            for task_id in hits:
+                r = id_rows.get(task_id)
+                if r is not None:
+                    bits[r] = 1
+            self._search_bits = bits
+        else:
+            # Короткий запрос — просмотр всех текстов, но пачками: целиком в памяти их нет
+            vectorized = self._vectorized()
+            bits = bytearray()
+            for _, chunk in self._chunks(rows):
+                texts = self._search_texts(chunk)
+                part = self._np_search(texts, key) if vectorized else None
+                bits += part if part is not None else bytearray(key in text for text in texts)
+            self._search_bits = bits
+
+    def _ensure_trigrams(self):
+        # Строим пачками: триграммы остаются в индексе, тексты пачки — нет
+        if self._trigrams is None or self._trigrams.stale():
+            index = TrigramIndex(self._verify)
+            ids = self._value
+            for _, chunk in self._chunks(self._rows()):
+                for r, text in zip(chunk, self._search_texts(chunk)):
+                    index.add(ids(r, "id"), text)
+            self._trigrams = index
+        return self._trigrams
+
+    def _verify(self, task_ids, key):
+        # Кандидаты из индекса: полные тексты читаем только для них
+        rows = self._rows()
+        id_rows = self._id_row_map()
+        cand = [rows[r] for r in (id_rows.get(t) for t in task_ids) if r is not None]
+        found = set()
+        for _, chunk in self._chunks(cand):
+            for r, text in zip(chunk, self._search_texts(chunk)):
+                if key in text:
+                    found.add(self._value(r, "id"))
+        return found
+
+    def _id_row_map(self):
+        if self._id_rows is None:
+            ids = [self._value(r, "id") for r in self._rows()]
+            self._id_rows = dict(zip(ids, range(len(ids))))
+        return self._id_rows
+
+    def _perm(self, column):
+        perm = self._perms.get(column)
+        if perm is None:
+            rows = self._rows()
+            if self._vectorized():
+                perm = self._np_perm(column, rows)
+            else:
+                keys = [self._sort_key(column, r) for r in rows]
+                perm = sorted(range(len(rows)), key=keys.__getitem__)
+            self._perms[column] = perm
+        return perm
+
+    def _is_sorted(self):
+        return not self.server_sort and self._sort_column >= 0
+
+    def _order(self):
+        # Номера строк источника в порядке показа (до фильтра)
+        if not self._is_sorted():
+            return range(self._n)
+        perm = self._perm(self._sort_column)
+        return reversed(perm) if self._sort_order == QtCore.Qt.DescendingOrder else perm
+
+    def _mode_index(self):
+        try:
+            return self._mode_keys.index(self.mode)
+        except ValueError:
+            return 0
+
+    def _mask(self):
+        idx = self._mode_index()
+        base = self._members[idx] if idx else None
+        if base is None:
+            return self._search_bits
+        if self._search_bits is None:
+            return base
+        return _and(base, self._search_bits)
+
+    def _cached_visible(self):
+        # Возврат к недавней выборке (режим/поиск/сортировка) — без пересчёта
+        sort = (self._sort_column, int(self._sort_order)) if self._is_sorted() else None
+        key = ("visible", self.mode, self._search_spec(), sort, self._today)
+        visible = self.result_cache.get(key, self._cache_generation())
+        if visible is None:
+            visible = self._compute_visible()
+            self.result_cache.put(key, visible, self._cache_generation())
+        return visible
+
+    def _compute_visible(self):
+        order = list(self._order())
+        mask = self._mask()
+        if mask is None:
+            return order
+        return list(compress(order, map(mask.__getitem__, order)))
+
+    def _accepts(self, src_row):
+        idx = self._mode_index()
+        if idx and not self._members[idx][src_row]:
+            return False
+        return self._search_bits is None or bool(self._search_bits[src_row])
+
+    def _pos_map(self):
+        if self.passthrough:
+            return _Identity(self._n)
+        if self._pos is None:
+            self._pos = dict(zip(self._visible, range(len(self._visible))))
+        return self._pos
+
+    def _before(self, a, b):
+        # a идёт раньше b в порядке показа
+        if not self._is_sorted():
+            return a < b
+        rows = self._rows()
+        ka, kb = self._sort_key(self._sort_column, rows[a]), self._sort_key(self._sort_column, rows[b])
+        return ka > kb if self._sort_order == QtCore.Qt.DescendingOrder else ka < kb
+
+    def _find_slot(self, src_row):
+        # Двоичный поиск места строки среди видимых (они уже упорядочены)
+        vis = self._visible
+        lo, hi = 0, len(vis)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._before(vis[mid], src_row):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _perm_insert(self, perm, column, src_row):
+        rows = self._rows()
+        key = self._sort_key(column, rows[src_row])
+        lo, hi = 0, len(perm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._sort_key(column, rows[perm[mid]]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        perm.insert(lo, src_row)
+
+    # ===== Публичный интерфейс (как у прежнего FilterProxy) =====
+    def setMode(self, mode: str):
+        if self.mode != mode:
+            self.mode = mode
+            self._refilter()
+
+    def setViews(self, views):
+        """
+        views — [(ключ режима, Plan)]: режим с таким ключом показывает строки, подходящие под запрос.
+        """
+        self._views = list(views)
+        self._mode_keys = list(MODES) + [key for key, _ in self._views]
+        self.invalidate()
+
+    def date_terms(self):
+        """
+        (колонка, сдвиг в днях), от которых зависят режимы, виды и запрос поиска:
+        со сменой даты меняется принадлежность только строк с датами около этих сдвигов.
+        """
+        terms = {("due_date", 0)}
+        for _, plan in self._views:
+            terms.update(plan.relative_dates())
+        if self.query is not None:
+            terms.update(self.query.relative_dates())
+        return terms
+
+    def setToday(self, today):
+        """
+        Новая дата без пересборки: готовые выборки сбрасываются, а принадлежность строк
+        пересчитывается точечно — по dataChanged от модели для строк, чья дата задета.
+        """
+        if today == self._today:
+            return
+        self._today = today
+        self._generation += 1
+
+    def count(self, mode):
+        # Сколько строк источника попадает в режим/вид (без учёта поиска); None — нет такого режима
+        if self.passthrough:
+            return None
+        try:
+            return self._counts[self._mode_keys.index(mode)]
+        except (ValueError, IndexError):
+            return None
+
+    def setSearch(self, text: str):
+        key = fold_key(text)
+        if key != self.search_key or self.query is not None:
+            self.search_key = key
+            self.query = None
+            self._rebuild_search()
+            self._refilter()
+
+    def setQuery(self, query, ids=None):
+        """
+        Фильтр по разобранному запросу (app/query.py). ids — готовый ответ БД
+        (repo.query_ids); без него строки проверяются в памяти.
+        """
+        self.search_key = ""
+        self.query = query
+        self._query_ids = ids
+        self._rebuild_search()
+        self._refilter()
+
+    def setServerSort(self, enabled: bool):
+        enabled = bool(enabled)
+        if enabled != self.server_sort:
+            self.server_sort = enabled
+            self._relayout()
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        if (self.server_sort or self.passthrough) and self.sourceModel() is not None:
+            # Сами не сортируем — сохраняем порядок источника, а запрос переиздаёт модель
+            self._sort_column, self._sort_order = column, order
+            self.sourceModel().sort(column, order)
+            return
+        if (column, order) == (self._sort_column, self._sort_order):
+            return
+        self._sort_column, self._sort_order = column, order
+        self._relayout()
+
+    def invalidate(self):
+        # Полный пересчёт (например, сменилась дата — "Просроченные"/"На сегодня")
+        self.beginResetModel()
+        self._rebuild()
+        self.endResetModel()
+
+    def _refilter(self):
+        # Меняется состав строк — сбрасываем вид (без обхода строк через Python-колбэки)
+        if self.passthrough:
+            # Фильтрует БД: состав поменяет перезагрузка источника
+            return
+        self.beginResetModel()
+        self._visible = self._cached_visible()
+        self._pos = None
+        self.endResetModel()
+
+    def _relayout(self):
+        # Меняется только порядок: переносим постоянные индексы (выделение) на новые места
+        if self.passthrough:
+            return
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        src = [(self._visible[i.row()], i.column()) if 0 <= i.row() < len(self._visible) else None for i in old]
+        self._visible = self._cached_visible()
+        self._pos = None
+        pos = self._pos_map()
+        new = []
+        for item in src:
+            p = pos.get(item[0]) if item is not None else None
+            new.append(self.index(p, item[1]) if p is not None else QtCore.QModelIndex())
+        self.changePersistentIndexList(old, new)
+        self.layoutChanged.emit()
+
+    # ===== Изменения источника =====
+    def _on_source_reset(self):
+        self._rebuild()
+        self.endResetModel()
+
+    def _on_source_data_changed(self, top_left, bottom_right, roles=None):
+        if self.passthrough:
+            self.dataChanged.emit(self.index(top_left.row(), top_left.column()),
+                                  self.index(bottom_right.row(), bottom_right.column()), list(roles or []))
+            return
+        counts_changed = False
+        # Повлияла ли правка на готовые выборки (иначе кэш результатов остаётся в силе)
+        changed = False
+        left, right = top_left.column(), bottom_right.column()
+        only_color = bool(roles) and all(role == QtCore.Qt.ForegroundRole for role in roles)
+        # Перестановки колонок, чей ключ сортировки мог поменяться
+        perms = {} if only_color else {c: p for c, p in self._perms.items() if left <= c <= right}
+        rows = self._rows()
+        # Текст для поиска (название/описание) перечитываем, только если задеты их колонки
+        texts = {}
+        if self._text_changed(top_left.column(), bottom_right.column(), roles) and \
+                (self._trigrams is not None or (self._search_bits is not None and self.query is None)):
+            span = range(max(top_left.row(), 0), min(bottom_right.row() + 1, self._n))
+            texts = dict(zip(span, self._search_texts(rows[r] for r in span)))
+        for r in range(top_left.row(), bottom_right.row() + 1):
+            if r < 0 or r >= self._n:
+                continue
+            row = rows[r]
+            self._np_set(r, row)
+            for i, f in enumerate(self._flags(row)):
+                old = self._members[i][r]
+                if old != f:
+                    self._members[i][r] = f
+                    self._counts[i] += f - old
+                    counts_changed = changed = True
+            text = texts.get(r)
+            if self._trigrams is not None and text is not None:
+                self._trigrams.update(self._value(row, "id"), text)
+            if self._search_bits is not None:
+                old = self._search_bits[r]
+                if self.query is not None:
+                    self._search_bits[r] = self._matches(row)
+                elif text is not None:
+                    self._search_bits[r] = self.search_key in text
+                changed = changed or old != self._search_bits[r]
+            # Перестановки: строку вынимаем и вставляем по новому ключу
+            for column, perm in perms.items():
+                perm.remove(r)
+                self._perm_insert(perm, column, r)
+                changed = True
+            self._place_row(r, left, right, roles)
+        if changed:
+            self._generation += 1
+        if counts_changed:
+            self.countsChanged.emit()
+
+    def _text_changed(self, left, right, roles):
+        # Цвет, догрузка колонок (роли без EditRole — значение не менялось) и прочие колонки
+        # на текст поиска не влияют
+        if roles and QtCore.Qt.EditRole not in roles:
+            return False
+        column_index = getattr(self.sourceModel(), "column_index", None)
+        if column_index is None:
+            return True
+        cols = [column_index(k) for k in ("title", "description")]
+        return any(c < 0 or left <= c <= right for c in cols)
+
+    def _place_row(self, r, left, right, roles):
+        pos = self._pos_map()
+        old_p = pos.get(r)
+        visible = self._accepts(r)
+        if old_p is None and not visible:
+            return
+        if old_p is None:
+            p = self._find_slot(r)
+            self.beginInsertRows(QtCore.QModelIndex(), p, p)
+            self._visible.insert(p, r)
+            self._pos = None
+            self.endInsertRows()
+            return
+        if not visible:
+            self.beginRemoveRows(QtCore.QModelIndex(), old_p, old_p)
+            del self._visible[old_p]
+            self._pos = None
+            self.endRemoveRows()
+            return
+        # Осталась видимой: где её место без неё самой?
+        del self._visible[old_p]
+        new_p = self._find_slot(r)
+        self._visible.insert(old_p, r)
+        if new_p != old_p:
+            dest = new_p if new_p < old_p else new_p + 1
+            self.beginMoveRows(QtCore.QModelIndex(), old_p, old_p, QtCore.QModelIndex(), dest)
+            del self._visible[old_p]
+            self._visible.insert(new_p, r)
+            self._pos = None
+            self.endMoveRows()
+            old_p = new_p
+        self.dataChanged.emit(self.index(old_p, left), self.index(old_p, right), list(roles or []))
+
+    def _on_source_rows_inserted(self, parent, first, last):
+        if parent.isValid():
+            return
+        if first != self._n or self.passthrough:
+            # Модель дописывает только в конец; вставка в середину — пересобираем всё
+            self.invalidate()
+            return
+        self._generation += 1
+        rows = self._rows()
+        count = last - first + 1
+        self._n += count
+        self._np_append([rows[r] for r in range(first, last + 1)])
+        texts = {}
+        if self._trigrams is not None or (self._search_bits is not None and self.query is None):
+            texts = dict(zip(range(first, last + 1), self._search_texts(rows[r] for r in range(first, last + 1))))
+        for r in range(first, last + 1):
+            for i, f in enumerate(self._flags(rows[r])):
+                self._members[i].append(f)
+                self._counts[i] += f
+            if self._trigrams is not None:
+                self._trigrams.add(self._value(rows[r], "id"), texts[r])
+            if self._id_rows is not None:
+                self._id_rows[self._value(rows[r], "id")] = r
+            if self._search_bits is not None:
+                self._search_bits.append(self._matches(rows[r]) if self.query is not None
+                                         else self.search_key in texts[r])
+            for column, perm in self._perms.items():
+                self._perm_insert(perm, column, r)
+        new_visible = self._compute_visible()
+        # Новые строки вставляем по возрастанию итоговых позиций, подряд идущие — одним диапазоном
+        slots = [p for p, r in enumerate(new_visible) if r >= first]
+        i = 0
+        while i < len(slots):
+            j = i
+            while j + 1 < len(slots) and slots[j + 1] == slots[j] + 1:
+                j += 1
+            self.beginInsertRows(QtCore.QModelIndex(), slots[i], slots[j])
+            self._visible[slots[i]:slots[i]] = new_visible[slots[i]:slots[j] + 1]
+            self._pos = None
+            self.endInsertRows()
+            i = j + 1
+        self.countsChanged.emit()
+
+    def _on_source_rows_about_to_be_removed(self, parent, first, last):
+        if parent.isValid():
+            return
+        self._generation += 1
+        if self.passthrough:
+            self.beginRemoveRows(QtCore.QModelIndex(), first, last)
+            return
+        if self._trigrams is not None:
+            rows = self._rows()
+            for r in range(first, last + 1):
+                self._trigrams.remove(self._value(rows[r], "id"))
+        # Номера строк сдвинутся — карту id -> строка построим заново при следующем поиске
+        self._id_rows = None
+        pos = self._pos_map()
+        slots = sorted((pos[r] for r in range(first, last + 1) if r in pos), reverse=True)
+        for p in slots:
+            self.beginRemoveRows(QtCore.QModelIndex(), p, p)
+            del self._visible[p]
+            self._pos = None
+            self.endRemoveRows()
+
+    def _on_source_rows_removed(self, parent, first, last):
+        if parent.isValid():
+            return
+        count = last - first + 1
+        self._n -= count
+        if self.passthrough:
+            self._visible = range(self._n)
+            self.endRemoveRows()
+            return
+        for i, bits in enumerate(self._members):
+            self._counts[i] -= bits[first:last + 1].count(1)
+            del bits[first:last + 1]
+        self._np_delete(first, last)
+        if self._search_bits is not None:
+            del self._search_bits[first:last + 1]
+
+        # Номера строк за удалёнными сдвигаются
+        def shift(seq):
+            return [r - count if r > last else r for r in seq if r < first or r > last]
+
+        self._perms = {column: shift(perm) for column, perm in self._perms.items()}
+        self._visible = shift(self._visible)
+        self._pos = None
+        self.countsChanged.emit()
+
+    # ===== QAbstractProxyModel =====
+    def mapToSource(self, proxy_index):
+        model = self.sourceModel()
+        if model is None or not proxy_index.isValid():
+            return QtCore.QModelIndex()
+        row = proxy_index.row()
+        if row < 0 or row >= len(self._visible):
+            return QtCore.QModelIndex()
+        return model.index(self._visible[row], proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QtCore.QModelIndex()
+        p = self._pos_map().get(source_index.row())
+        if p is None:
+            return QtCore.QModelIndex()
+        return self.index(p, source_index.column())
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.isValid() or row < 0 or row >= len(self._visible) or column < 0 or column >= self.columnCount():
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._visible)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        model = self.sourceModel()
+        return 0 if parent.isValid() or model is None else model.columnCount()
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Vertical:
+            if role == QtCore.Qt.DisplayRole:
+                return str(section + 1)
+            if role == QtCore.Qt.TextAlignmentRole:
+                return int(QtCore.Qt.AlignCenter)
+            return None
+        model = self.sourceModel()
+        return model.headerData(section, orientation, role) if model is not None else None
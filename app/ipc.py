@@ -0,0 +1,109 @@
+# Режим одного экземпляра: локальный сокет + пересылка командной строки.
+
+import os
+import json
+import getpass
+from PyQt5 import QtCore, QtNetwork
+
+from app.paths import APP_NAME
+
+CONNECT_TIMEOUT_MS = 150
+WRITE_TIMEOUT_MS = 500
+
+
+def server_name() -> str:
+    # Имя сокета — своё на каждого пользователя, чтобы не мешать соседям по машине
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = os.getenv("USERNAME") or os.getenv("USER") or "user"
+    return f"{APP_NAME}-{user}"
+
+
+def is_running(name=None) -> bool:
+    # Кто-то слушает сокет: подключение удалось
+    sock = QtNetwork.QLocalSocket()
+    sock.connectToServer(name or server_name())
+    if not sock.waitForConnected(CONNECT_TIMEOUT_MS):
+        return False
+    sock.disconnectFromServer()
+    return True
+
+
+def send_to_running(argv, name=None) -> bool:
+    """
+    Пытается передать argv уже запущенному экземпляру.
+    True — сообщение доставлено (текущий процесс может завершаться).
+    Работает до создания QApplication: только блокирующие вызовы.
+    """
+    sock = QtNetwork.QLocalSocket()
+    sock.connectToServer(name or server_name())
+    if not sock.waitForConnected(CONNECT_TIMEOUT_MS):
+        return False
+    try:
+        payload = json.dumps({"argv": list(argv)}, ensure_ascii=False)
+        sock.write(payload.encode("utf-8") + b"\n")
+        ok = sock.waitForBytesWritten(WRITE_TIMEOUT_MS)
+        sock.disconnectFromServer()
+        return ok
+    except Exception:
+        return False
+
+
+class SingleInstanceServer(QtCore.QObject):
+    # argv второго запуска (без имени программы)
+    messageReceived = QtCore.pyqtSignal(list)
+
+    def __init__(self, name=None, parent=None):
+        super().__init__(parent)
+        self.name = name or server_name()
+        self._server = QtNetwork.QLocalServer(self)
+        self._server.newConnection.connect(self._on_new_connection)
+        self._buffers = {}
+
+    def listen(self) -> bool:
+        if self._server.listen(self.name):
+            return True
+        # Сокет мог остаться от упавшего процесса (Unix). Убираем его, только если
+        # на нём никто не отвечает: иначе это живой экземпляр, запущенный после нашей проверки
+        if is_running(self.name):
+            return False
+        QtNetwork.QLocalServer.removeServer(self.name)
+        return self._server.listen(self.name)
+
+    def close(self):
+        try:
+            self._server.close()
+        except Exception:
+            pass
+
+    def _on_new_connection(self):
+        while self._server.hasPendingConnections():
+            sock = self._server.nextPendingConnection()
+            if sock is None:
+                break
+            self._buffers[sock] = b""
+            sock.readyRead.connect(lambda s=sock: self._on_ready_read(s))
+            sock.disconnected.connect(lambda s=sock: self._on_disconnected(s))
+
+    def _on_ready_read(self, sock):
+        self._buffers[sock] = self._buffers.get(sock, b"") + bytes(sock.readAll())
+        buf = self._buffers[sock]
+        while b"\n" in buf:
+            line, buf = buf.split(b"\n", 1)
+            self._dispatch(line)
+        self._buffers[sock] = buf
+
+    def _on_disconnected(self, sock):
+        rest = self._buffers.pop(sock, b"")
+        if rest.strip():
+            self._dispatch(rest)
+        sock.deleteLater()
+
+    def _dispatch(self, line):
+        try:
+            msg = json.loads(line.decode("utf-8"))
+            argv = msg.get("argv") or []
+        except Exception:
+            return
+        self.messageReceived.emit([str(a) for a in argv])
@@ -1,12 +1,19 @@
 
+import os
 import sys
 import ctypes
+import logging
 from pathlib import Path
 from PyQt5 import QtWidgets, QtCore, QtGui
 from app.db import init_db
 from app.repo import TaskRepo
 from app.views import FramelessWindow
 from app.theme import enable_dark_theme, enable_light_theme
+from app.ipc import send_to_running, SingleInstanceServer
+from app.cli import parse_command, apply_command, CommandError
+from app.paths import user_data_dir, db_path
+from app.profiles import choose_profile, profile_page_size, is_explicit
+from app.pool import DEFAULT_BUSY_TIMEOUT_MS
 
 # Включаем HiDPI ДО создания QApplication
 QtWidgets.QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True)
@@ -71,12 +78,63 @@ def find_icon():
 
 
 def main():
+    # Некорректная команда — сообщаем и выходим, окно не открываем (и запущенному не пересылаем)
+    argv = sys.argv[1:]
+    try:
+        cmd = parse_command(argv)
+    except CommandError as e:
+        if sys.stderr is not None:
+            print(f"PlanBoard: ошибка: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    # Уже запущен? Передаём ему командную строку и выходим — без Qt GUI и без БД
+    if send_to_running(argv):
+        sys.exit(0)
+
+    # CLI-команда без запущенного окна: применяем напрямую и выходим
+    if cmd is not None:
+        init_db()
+        repo = TaskRepo()
+        try:
+            apply_command(repo, cmd)
+        finally:
+            repo.close()
+        sys.exit(0)
+
+    # Служебный журнал (обслуживание БД и т.п.) — рядом с базой
+    try:
+        logging.basicConfig(
+            filename=os.path.join(user_data_dir(), "planboard.log"),
+            level=logging.INFO,
+            format="%(asctime)s %(name)s %(levelname)s %(message)s",
+        )
+    except Exception:
+        pass
+
     # Важно для корректной иконки в таскбаре/группировки на Windows
     set_win_appusermodel_id("YourCompany.PlanBoard")
 
     app = QtWidgets.QApplication(sys.argv)
     app.setQuitOnLastWindowClosed(True)
 
+    # Слушаем последующие запуски сразу, до БД и окна: второй запуск во время старта
+    # должен найти сервер, а не открыть ещё одно окно. Сокет занял экземпляр, стартовавший
+    # одновременно с нами, — отдаём командную строку ему
+    instance_server = SingleInstanceServer(parent=app)
+    if not instance_server.listen() and send_to_running(argv):
+        sys.exit(0)
+    app.aboutToQuit.connect(instance_server.close)
+    # Сообщения, пришедшие до создания окна, копим и отдаём ему потом
+    win = None
+    early_messages = []
+
+    def on_instance_message(message):
+        if win is None:
+            early_messages.append(message)
+        else:
+            win.on_instance_message(message)
+    instance_server.messageReceived.connect(on_instance_message)
+
     # Тема
     settings = QtCore.QSettings("YourCompany", "PlanBoard")
     theme = settings.value("theme", "dark")
@@ -97,8 +155,17 @@ def main():
             app.setWindowIcon(icon)
             app_icon = icon  # держим ссылку
 
-    init_db()
-    repo = TaskRepo()
+    # Профиль производительности БД: "auto" — по размеру файла.
+    # Размер страницы auto задаёт только новой БД; существующую переводит лишь явно выбранный профиль
+    requested = settings.value("db/profile", "auto")
+    profile = choose_profile(db_path(), requested)
+    init_db(page_size=profile_page_size(profile), convert_page_size=is_explicit(requested))
+    try:
+        busy_timeout_ms = int(settings.value("db/busy_timeout_ms", DEFAULT_BUSY_TIMEOUT_MS))
+    except Exception:
+        busy_timeout_ms = DEFAULT_BUSY_TIMEOUT_MS
+    repo = TaskRepo(profile=profile, busy_timeout_ms=busy_timeout_ms)
+    logging.getLogger("planboard").info("db profile: %s", repo.profile)
     win = FramelessWindow(repo)
 
     # Если окно само не выставляет иконку — выставим
@@ -112,6 +179,9 @@ def main():
     # ВАЖНО: трей отключён — не создаём QSystemTrayIcon вообще
     # (раньше тут был код создания win.tray и .setVisible(True))
 
+    for message in early_messages:
+        win.on_instance_message(message)
+
     win.show()
     sys.exit(app.exec_())
 
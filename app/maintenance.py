@@ -0,0 +1,205 @@
+# Обслуживание БД: статистика планировщика, чекпоинт WAL, возврат свободных страниц
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from PyQt5 import QtCore, QtGui
+
+log = logging.getLogger("planboard.maintenance")
+
+# Полный VACUUM (нужен один раз, чтобы включить auto_vacuum=INCREMENTAL) — только для небольших БД
+FULL_VACUUM_MAX_BYTES = 64 * 1024 * 1024
+# Сколько страниц освобождать за шаг incremental_vacuum
+VACUUM_STEP_PAGES = 256
+# Сколько байт в секунду SQLite заведомо успевает переписать: по этому решаем, поместится ли
+# в бюджет чекпоинт (копирует WAL) и полный VACUUM (пишет базу дважды) — их не прервать посередине
+COPY_BYTES_PER_SEC = 64 * 1024 * 1024
+# Как часто (в инструкциях VM SQLite) проверять срок: шаг прерывается, как только бюджет вышел
+PROGRESS_OPS = 1000
+
+IDLE_AFTER_SEC = 5 * 60          # пользователь ничего не трогает столько времени
+MIN_INTERVAL_SEC = 12 * 60 * 60  # и с прошлого обслуживания прошло не меньше
+IDLE_BUDGET_SEC = 0.3
+QUIT_BUDGET_SEC = 1.0
+
+
+def db_stats(conn, path):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal = path + "-wal"
+    return {
+        "db_bytes": page_size * page_count,
+        "free_bytes": page_size * freelist,
+        "wal_bytes": os.path.getsize(wal) if os.path.isfile(wal) else 0,
+    }
+
+
+def run_maintenance(repo, budget=IDLE_BUDGET_SEC, allow_full_vacuum=False):
+    """
+    Шаги от дешёвых к дорогим, пока не исчерпан бюджет времени (сек):
+    ANALYZE/PRAGMA optimize -> wal_checkpoint(TRUNCATE) -> incremental_vacuum.
+    Работает на своём соединении (зовётся из рабочего потока), писатель приложения не занимает:
+    его записи ждут разве что короткий шаг. Бюджет соблюдается и внутри шага: progress handler
+    прерывает запрос после срока (SQLite откатывает его целиком), а чекпоинт и VACUUM
+    запускаются, только если успевают.
+    Возвращает статистику (размеры до/после, длительность, выполненные шаги).
+    """
+    started = time.monotonic()
+    deadline = started + max(0.0, float(budget))
+    done = []
+    conn = sqlite3.connect(repo.path)
+    try:
+        conn.execute(f"PRAGMA busy_timeout = {int(repo.db.busy_timeout_ms)}")
+        before = db_stats(conn, repo.path)
+        # Ненулевой ответ обработчика прерывает текущий запрос с OperationalError("interrupted")
+        conn.set_progress_handler(lambda: time.monotonic() >= deadline, PROGRESS_OPS)
+        try:
+            # Статистика для планировщика: первый раз — ANALYZE, дальше optimize сам решает
+            conn.execute("PRAGMA analysis_limit = 400")
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+            ).fetchone()
+            conn.execute("PRAGMA optimize" if has_stats else "ANALYZE main")
+            conn.commit()
+            done.append("optimize" if has_stats else "analyze")
+
+            if before["wal_bytes"] / COPY_BYTES_PER_SEC < deadline - time.monotonic():
+                conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)").fetchone()
+                done.append("checkpoint")
+
+            auto_vacuum = conn.execute("PRAGMA main.auto_vacuum").fetchone()[0]
+            if auto_vacuum != 2:
+                # Режим INCREMENTAL включается только полным VACUUM (размер страницы — в init_db)
+                left = deadline - time.monotonic()
+                if allow_full_vacuum and before["db_bytes"] <= FULL_VACUUM_MAX_BYTES \
+                        and 2 * before["db_bytes"] / COPY_BYTES_PER_SEC <= left:
+                    conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+                    conn.execute("VACUUM main")
+                    done.append("vacuum")
+            else:
+                while time.monotonic() < deadline:
+                    if not conn.execute("PRAGMA main.freelist_count").fetchone()[0]:
+                        break
+                    conn.execute(f"PRAGMA main.incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+                    if "incremental_vacuum" not in done:
+                        done.append("incremental_vacuum")
+                conn.commit()
+        except sqlite3.Error as e:
+            # Занято читателями/другим процессом — не страшно, повторим в следующий раз
+            if time.monotonic() >= deadline:
+                log.info("maintenance stopped at budget: %s", e)
+            else:
+                log.warning("maintenance interrupted: %s", e)
+            if conn.in_transaction:
+                conn.rollback()
+        finally:
+            conn.set_progress_handler(None, 0)
+        after = db_stats(conn, repo.path)
+    finally:
+        conn.close()
+
+    stats = {
+        "steps": done,
+        "duration_ms": int((time.monotonic() - started) * 1000),
+        "before": before,
+        "after": after,
+    }
+    log.info(
+        "maintenance %s in %d ms: db %d -> %d bytes, free %d -> %d, wal %d -> %d",
+        ",".join(done) or "-", stats["duration_ms"],
+        before["db_bytes"], after["db_bytes"],
+        before["free_bytes"], after["free_bytes"],
+        before["wal_bytes"], after["wal_bytes"],
+    )
+    return stats
+
+
+class MaintenanceScheduler(QtCore.QObject):
+    """
+    Запускает обслуживание в рабочем потоке, когда пользователь бездействует, и один раз при выходе.
+    Бездействие определяется раз в минуту по таймеру (курсор на месте и нет новых записей) —
+    без фильтра событий на всё приложение.
+    Время последнего запуска хранится в QSettings, чтобы не повторяться на каждом старте.
+    """
+    # Статистика прогона (доставляется в GUI-поток)
+    finished = QtCore.pyqtSignal(object)
+
+    def __init__(self, repo, settings, parent=None):
+        super().__init__(parent)
+        self.repo = repo
+        self.settings = settings
+        self.last_stats = None
+        self._last_input = time.monotonic()
+        self._last_cursor = None
+        self._last_counter = None
+        self._quit_done = False
+        self._thread = None
+        self.finished.connect(self._on_finished)
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(60 * 1000)
+        self._timer.timeout.connect(self._on_tick)
+        self._timer.start()
+
+    def _note_activity(self):
+        # Сдвинулась мышь или что-то записано (правка, импорт) — пользователь не бездействует
+        cursor = QtGui.QCursor.pos()
+        cursor = (cursor.x(), cursor.y())
+        counter = self.repo.change_counter
+        if cursor != self._last_cursor or counter != self._last_counter:
+            self._last_input = time.monotonic()
+        self._last_cursor, self._last_counter = cursor, counter
+
+    def _last_run(self):
+        try:
+            return float(self.settings.value("maintenance/last_run", 0) or 0)
+        except Exception:
+            return 0.0
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _on_tick(self):
+        self._note_activity()
+        if time.monotonic() - self._last_input < IDLE_AFTER_SEC:
+            return
+        if time.time() - self._last_run() < MIN_INTERVAL_SEC:
+            return
+        self.run(IDLE_BUDGET_SEC)
+
+    def run(self, budget, allow_full_vacuum=False):
+        if self.is_running():
+            return
+        self._thread = threading.Thread(target=self._work, args=(budget, allow_full_vacuum),
+                                        name="PlanBoard-maintenance", daemon=True)
+        self._thread.start()
+
+    def _work(self, budget, allow_full_vacuum):
+        try:
+            stats = run_maintenance(self.repo, budget=budget, allow_full_vacuum=allow_full_vacuum)
+        except Exception:
+            log.exception("maintenance failed")
+            stats = None
+        self.last_stats = stats
+        self.finished.emit(stats)
+
+    def _on_finished(self, stats):
+        if stats is not None:
+            self.settings.setValue("maintenance/last_run", time.time())
+
+    def run_on_quit(self):
+        # На выходе окно уже не мешаем — можно и разовый полный VACUUM небольшой БД;
+        # ждём поток сами: очередь событий, через которую идёт finished, уже не крутится
+        if self._quit_done:
+            return
+        self._quit_done = True
+        self._timer.stop()
+        if not self.is_running():
+            self.run(QUIT_BUDGET_SEC, allow_full_vacuum=True)
+        if self._thread is not None:
+            self._thread.join(QUIT_BUDGET_SEC + 1.0)
+        if not self.is_running():
+            self._on_finished(self.last_stats)
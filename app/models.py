@@ -3,6 +3,10 @@
 from PyQt5 import QtCore, QtGui
 import datetime
 
+from app.db import fold_key
+from app.repo import REQUIRED_COLUMNS
+from app.row_cache import BlockRowCache, LazyRows, BLOCK_ROWS, DEFAULT_MAX_BYTES
+
 class TaskTableModel(QtCore.QAbstractTableModel):
     # Ключи полей и заголовки колонок
     COLUMNS = [
@@ -15,6 +19,9 @@ class TaskTableModel(QtCore.QAbstractTableModel):
         # ("id", "ID"),  # больше не показываем ID в таблице
     ]
  
+    # Что показывать в ячейке вместо самого поля (описание — коротким превью)
+    DISPLAY_KEYS = {"description": "desc_preview"}
+
     TUPLE_INDEX = {
         "id": 0,
         "title": 1,
@@ -25,19 +32,236 @@ class TaskTableModel(QtCore.QAbstractTableModel):
         "priority": 6,
     }
 
-    def __init__(self, repo, parent=None):
+    # Цвета строк по классу (светлая тема); на тёмном фоне красный и зелёный осветляются
+    ROW_COLORS = {"done": "#777777", "overdue": "red", "today": "green"}
+    STATUS_TEXT = ("Открыта", "Готово")
+    # Строк в кэше готовых строк отображения; больше — кэш начинается заново
+    DISPLAY_CACHE_ROWS = 20000
+
+    # Номера строк модели, у которых догрузились ленивые колонки
+    rowsFilled = QtCore.pyqtSignal(list)
+    # True — строки читаются окнами из БД (WindowedTaskModel), фильтр и сортировка в SQL
+    windowed = False
+
+    def __init__(self, repo, parent=None, page_size=None):
         super().__init__(parent)
         self.repo = repo
         self.rows = []
+        # Проекция: какие колонки тянуть списком (описание репозиторий всегда отдаёт лениво)
+        self.columns = [self.DISPLAY_KEYS.get(k, k) for k, _ in self.COLUMNS]
+        # Ожидающие догрузки: id задачи -> множество колонок
+        self._pending_fill = {}
+        self._fill_timer = QtCore.QTimer(self)
+        self._fill_timer.setSingleShot(True)
+        self._fill_timer.setInterval(0)
+        self._fill_timer.timeout.connect(self._fill_pending)
         self.order_by = "due_date ASC, priority DESC, id DESC"
+        self.change_seq = 0
+        # Постраничная загрузка (None — всё сразу); включается вместе с сортировкой в БД
+        self.page_size = page_size
+        self._has_more = False
+        # Поиск по названию на стороне БД (используется вместе с постраничной загрузкой)
+        self.title_search = None
+        # Запрос строки поиска (Plan из app/query.py) — тоже уходит в WHERE при постраничной загрузке
+        self.query = None
+        # Режим "Выполненные" вместе с архивом (UNION-представление, только постранично)
+        self.include_archive = False
+
+        # Таблицы по колонкам (вместо поиска по COLUMNS в каждом data())
+        self._col_keys = [k for k, _ in self.COLUMNS]
+        self._col_index = {k: i for i, k in enumerate(self._col_keys)}
+        self._col_src = [self.DISPLAY_KEYS.get(k, k) for k in self._col_keys]
+        # Поле строки -> колонка, которая его показывает (desc_preview -> «Описание»)
+        self._src_index = {src: i for i, src in enumerate(self._col_src)}
+        right = int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+        left = int(QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter)
+        self._col_align = [right if k in ("priority", "id") else left for k in self._col_keys]
+        self._role_handlers = {
+            QtCore.Qt.DisplayRole: self._display,
+            QtCore.Qt.ToolTipRole: self._tooltip,
+            QtCore.Qt.TextAlignmentRole: lambda r, c: self._col_align[c],
+            QtCore.Qt.ForegroundRole: self._foreground,
+        }
+        # id задачи -> тексты ячеек по колонкам; id -> класс раскраски ("done"/"overdue"/"today"/"")
+        self._display_cache = {}
+        self._row_class = {}
+        self.today = datetime.date.today()
+        self.set_palette(None)
+        # Любое изменение строки проходит через эти сигналы — по ним и чистим кэши
+        self.dataChanged.connect(self._on_own_data_changed)
+        self.rowsAboutToBeRemoved.connect(self._on_own_rows_removed)
+        self.modelReset.connect(self._clear_caches)
 
         self.load()
 
     def load(self):
         self.beginResetModel()
-        self.rows = self.repo.list_tasks(self.order_by)
+        self.today = datetime.date.today()
+        # seq берём ДО выборки: всё, что успеет измениться между ними, придёт повторно (идемпотентно)
+        self.change_seq = self.repo.last_change_seq()
+        if self.page_size:
+            self.rows = self.repo.list_tasks(self.order_by, limit=self.page_size,
+                                             title_contains=self.title_search, query=self.query, columns=self.columns,
+                                             include_archive=self.include_archive)
+            self._has_more = len(self.rows) >= self.page_size
+        else:
+            self.rows = self.repo.list_tasks(self.order_by, columns=self.columns)
+            self._has_more = False
+        self._pending_fill.clear()
         self.endResetModel()
 
+    def set_columns(self, keys):
+        # Новая проекция действует со следующей загрузки; недостающее догрузится при отрисовке
+        self.columns = [self.DISPLAY_KEYS.get(k, k) for k in keys]
+
+    # ===== Ленивая догрузка колонок (описание и скрытые при загрузке) =====
+    def _request_fill(self, row, key):
+        task_id = self._get_value(row, "id")
+        if task_id is None:
+            return
+        self._pending_fill.setdefault(task_id, set()).add(key)
+        # Все запросы одного прохода отрисовки уйдут одной пачкой
+        if not self._fill_timer.isActive():
+            self._fill_timer.start()
+
+    def _fill_pending(self):
+        pending, self._pending_fill = self._pending_fill, {}
+        if not pending:
+            return
+        keys = set()
+        for ks in pending.values():
+            keys |= ks
+        try:
+            values = self.repo.get_columns(list(pending), sorted(keys))
+        except Exception:
+            return
+        pos_by_id = self._positions(pending)
+        touched = []
+        for task_id, ks in pending.items():
+            row = self._loaded_row(pos_by_id.get(task_id, -1))
+            if not isinstance(row, dict):
+                continue
+            pos = pos_by_id[task_id]
+            got = values.get(task_id) or {}
+            # Отсутствующая в БД задача — ставим None, чтобы не запрашивать снова
+            row.update({k: got.get(k) for k in ks})
+            # Колонка по самому полю или по тому, что она показывает (превью описания)
+            cols = [c for c in (self._col_index.get(k, self._src_index.get(k, -1)) for k in ks) if c >= 0]
+            if cols:
+                # Значения в БД не менялись — их только показали (роли без EditRole)
+                self.dataChanged.emit(self.index(pos, min(cols)), self.index(pos, max(cols)),
+                                      [QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole])
+            touched.append(pos)
+        if touched:
+            self.rowsFilled.emit(touched)
+
+    # ===== Подписка на шину изменений (ChangeBus) =====
+    def connect_bus(self, bus):
+        bus.taskInserted.connect(self.on_task_inserted)
+        bus.taskUpdated.connect(self.on_task_updated)
+        bus.tasksDeleted.connect(self.remove_tasks)
+
+    def search_bodies(self, task_ids):
+        # Полные описания для поиска (id -> свёрнутый текст), в том числе длинные из task_bodies
+        got = self.repo.get_columns(list(task_ids), ["description"])
+        return {task_id: fold_key((got.get(task_id) or {}).get("description")) for task_id in task_ids}
+
+    def _fetch_rows(self, task_ids, columns=None):
+        # Текущие значения строк из БД в проекции модели: {id: {колонка: значение}}
+        cols = columns or list(REQUIRED_COLUMNS) + list(self.columns)
+        cols = [c for c in dict.fromkeys(cols) if c != "id"]
+        try:
+            return self.repo.get_columns(list(task_ids), cols)
+        except Exception:
+            return None
+
+    def on_task_inserted(self, task_id):
+        if self.row_of_task(task_id) >= 0:
+            return
+        got = self._fetch_rows([task_id])
+        if got and task_id in got:
+            row = {"id": task_id}
+            row.update(got[task_id])
+            self.insert_task(row)
+
+    def on_task_updated(self, task_id, fields):
+        pos = self.row_of_task(task_id)
+        if pos < 0 or not isinstance(self.rows[pos], dict):
+            return
+        # Перечитываем ровно те колонки, что уже есть в строке (включая догруженные)
+        got = self._fetch_rows([task_id], [k for k in self.rows[pos] if k != "archived"])
+        if got is None:
+            return
+        if task_id not in got:
+            self.remove_tasks([task_id])
+            return
+        self.rows[pos].update(got[task_id])
+        cols = [self.column_index(k) for k in fields if self.column_index(k) >= 0]
+        if cols:
+            self.dataChanged.emit(self.index(pos, min(cols)), self.index(pos, max(cols)))
+
+    # ===== Подгрузка страниц (вид сам зовёт при прокрутке к концу) =====
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return (not parent.isValid()) and self._has_more
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or not self._has_more:
+            return
+        page = self.repo.list_tasks(self.order_by, limit=self.page_size, offset=len(self.rows),
+                                    title_contains=self.title_search, query=self.query, columns=self.columns,
+                                    include_archive=self.include_archive)
+        self._has_more = len(page) >= self.page_size
+        # Между страницами могли прийти вставки/удаления — дубли по id отбрасываем
+        known = {self._get_value(r, "id") for r in self.rows}
+        page = [r for r in page if r.get("id") not in known]
+        if not page:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+
+    # ===== Сортировка на стороне БД =====
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        if column < 0 or column >= len(self.COLUMNS):
+            return
+        key = self.COLUMNS[column][0]
+        direction = "DESC" if order == QtCore.Qt.DescendingOrder else "ASC"
+        # Тай-брейк по id в ту же сторону — индекс по колонке покрывает ORDER BY целиком
+        order_by = f"{key} {direction}, id {direction}"
+        if order_by == self.order_by and self.rows:
+            return
+        self.order_by = order_by
+        self.load()
+
+    def sync_changes(self):
+        """
+        Подтягивает изменения из журнала БД и правит строки на месте.
+        Возвращает список изменённых/добавленных номеров строк модели.
+        """
+        res = self.repo.changes_since(self.change_seq, columns=self.columns)
+        if res is None:
+            self.load()
+            return list(range(len(self.rows)))
+        new_seq, rows, deleted = res
+        self.change_seq = new_seq
+        self.remove_tasks(deleted)
+        if not rows:
+            return []
+        # Один проход по строкам на всю пачку изменений
+        pos_by_id = self._positions(task.get("id") for task in rows)
+        touched = []
+        last_col = len(self.COLUMNS) - 1
+        for task in rows:
+            pos = pos_by_id.get(task.get("id"), -1)
+            if pos < 0:
+                pos = self.insert_task(task)
+            else:
+                self.rows[pos] = dict(task)
+                self.dataChanged.emit(self.index(pos, 0), self.index(pos, last_col))
+            touched.append(pos)
+        return touched
+
     def rowCount(self, parent=QtCore.QModelIndex()):
         return 0 if parent.isValid() else len(self.rows)
 
@@ -45,10 +269,7 @@ class TaskTableModel(QtCore.QAbstractTableModel):
         return 0 if parent.isValid() else len(self.COLUMNS)
 
     def column_index(self, key):
-        for i, (k, _) in enumerate(self.COLUMNS):
-            if k == key:
-                return i
-        return -1
+        return self._col_index.get(key, -1)
 
     def _get_value(self, row, key):
         # Поддержка и dict, и tuple
@@ -65,40 +286,112 @@ class TaskTableModel(QtCore.QAbstractTableModel):
     def data(self, index, role=QtCore.Qt.DisplayRole):
         if not index.isValid():
             return None
+        handler = self._role_handlers.get(role)
+        if handler is None:
+            return None
+        return handler(index.row(), index.column())
+
+    def _display(self, r, c):
+        row = self.rows[r]
+        task_id = self._get_value(row, "id")
+        texts = self._display_cache.get(task_id)
+        if texts is None:
+            if len(self._display_cache) >= self.DISPLAY_CACHE_ROWS:
+                self._display_cache.clear()
+            texts = self._display_cache[task_id] = [None] * len(self._col_keys)
+        text = texts[c]
+        if text is None:
+            text = self._display_text(row, c)
+            if text is None:
+                return ""
+            texts[c] = text
+        return text
+
+    def _display_text(self, row, c):
+        key = self._col_keys[c]
+        src = self._col_src[c] if isinstance(row, dict) else key
+        if isinstance(row, dict) and src not in row:
+            # Колонка не пришла в выборке — догрузим пачкой, пока пусто (и не кэшируем)
+            self._request_fill(row, src)
+            return None
+        if key == "completed":
+            return self.STATUS_TEXT[bool(self._get_value(row, "completed"))]
+        val = self._get_value(row, src)
+        return "" if val is None else str(val)
+
+    def _tooltip(self, r, c):
+        row = self.rows[r]
+        if self._col_keys[c] != "description" or not isinstance(row, dict):
+            return None
+        # Полный текст — только для обрезанных превью и только по наведению
+        preview = row.get("desc_preview") or ""
+        if not preview.endswith("…"):
+            return None
+        if "description" not in row:
+            self._request_fill(row, "description")
+            return preview
+        return row.get("description") or preview
+
+    def _foreground(self, r, c):
+        # Раскраска по срокам/статусу: класс строки считается один раз, кисти — готовые
+        row = self.rows[r]
+        task_id = self._get_value(row, "id")
+        cls = self._row_class.get(task_id)
+        if cls is None:
+            cls = self._row_class[task_id] = self._classify(row)
+        return self._brushes.get(cls)
+
+    def _classify(self, row):
+        due = self._get_value(row, "due_date")
+        if not due:
+            return ""
+        try:
+            due_date = datetime.date.fromisoformat(str(due))
+        except Exception:
+            return ""
+        if self._get_value(row, "completed"):
+            return "done"
+        if due_date < self.today:
+            return "overdue"
+        if due_date == self.today:
+            return "today"
+        return ""
 
-        row = self.rows[index.row()]
-        key = self.COLUMNS[index.column()][0]
-
-        if role == QtCore.Qt.DisplayRole:
-            if key == "completed":
-                return "Готово" if self._get_value(row, "completed") else "Открыта"
-            val = self._get_value(row, key)
-            return "" if val is None else str(val)
-
-        if role == QtCore.Qt.TextAlignmentRole:
-            if key in ("priority", "id"):
-                return int(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
-            return int(QtCore.Qt.AlignLeft | QtCore.Qt.AlignVCenter)
-
-        if role == QtCore.Qt.ForegroundRole:
-            # Раскраска по срокам/статусу
-            completed = bool(self._get_value(row, "completed"))
-            due = self._get_value(row, "due_date")
-            try:
-                if not due:
-                    return None
-                today = datetime.date.today()
-                due_date = datetime.date.fromisoformat(str(due))
-                if completed:
-                    return QtGui.QBrush(QtGui.QColor("#777777"))
-                elif due_date < today:
-                    return QtGui.QBrush(QtGui.QColor("red"))
-                elif due_date == today:
-                    return QtGui.QBrush(QtGui.QColor("green"))
-            except Exception:
-                pass
-
-        return None
+    def set_palette(self, palette):
+        """
+        Кисти раскраски под палитру темы. Перерисовать вид — забота вызывающего
+        (классы строк от палитры не зависят, пересчитывать нечего).
+        """
+        dark = palette is not None and palette.color(QtGui.QPalette.Window).lightness() < 128
+        brushes = {}
+        for cls, name in self.ROW_COLORS.items():
+            color = QtGui.QColor(name)
+            if dark and cls != "done":
+                color = color.lighter(150)
+            brushes[cls] = QtGui.QBrush(color)
+        self._brushes = brushes
+
+    # ===== Кэши отображения =====
+    def _clear_caches(self):
+        self._display_cache.clear()
+        self._row_class.clear()
+
+    # Слоты ниже берут только id (_id_at): строку через self.rows не трогаем —
+    # у оконной модели это было бы чтение блока из БД ради строки, которой нет на экране
+    def _on_own_data_changed(self, top_left, bottom_right, roles=None):
+        only_color = bool(roles) and all(role == QtCore.Qt.ForegroundRole for role in roles)
+        for pos in range(top_left.row(), bottom_right.row() + 1):
+            if 0 <= pos < len(self.rows):
+                task_id = self._id_at(pos)
+                self._row_class.pop(task_id, None)
+                if not only_color:
+                    self._display_cache.pop(task_id, None)
+
+    def _on_own_rows_removed(self, parent, first, last):
+        for pos in range(first, last + 1):
+            task_id = self._id_at(pos)
+            self._row_class.pop(task_id, None)
+            self._display_cache.pop(task_id, None)
 
     def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
         if role != QtCore.Qt.DisplayRole:
@@ -109,4 +402,276 @@ class TaskTableModel(QtCore.QAbstractTableModel):
 
     def task_at_row(self, row):
         return self.rows[row]
-    
\ No newline at end of file
+
+    # ===== Точечные изменения без полной перезагрузки =====
+    def insert_task(self, task):
+        # Добавляем строку в конец — порядок наводит прокси
+        if not task:
+            return -1
+        pos = len(self.rows)
+        self.beginInsertRows(QtCore.QModelIndex(), pos, pos)
+        self.rows.append(dict(task))
+        self.endInsertRows()
+        return pos
+
+    def _id_at(self, pos):
+        return self._get_value(self.rows[pos], "id")
+
+    def _loaded_row(self, pos):
+        # Строка, если она уже в памяти (None — нет такой); без чтения из БД
+        return self.rows[pos] if 0 <= pos < len(self.rows) else None
+
+    def _positions(self, task_ids):
+        # id -> номер строки для набора id — за один проход
+        ids = set(task_ids or ())
+        found = {}
+        for i, r in enumerate(self.rows):
+            task_id = self._get_value(r, "id")
+            if task_id in ids and task_id not in found:
+                found[task_id] = i
+        return found
+
+    def row_of_task(self, task_id):
+        for i, r in enumerate(self.rows):
+            if self._get_value(r, "id") == task_id:
+                return i
+        return -1
+
+    def rows_of_tasks(self, task_ids):
+        return sorted(self._positions(task_ids).values())
+
+    def set_today(self, today=None):
+        # Новая дата для раскраски: классы строк пересчитаются при следующей отрисовке
+        self.today = today or datetime.date.today()
+        self._row_class.clear()
+
+    def refresh_foreground(self, positions, today=None):
+        # Раскраска по сроку зависит от даты: перерисовать только цвет у этих строк
+        # (у остальных класс от смены даты не меняется — их кэш остаётся)
+        self.today = today or datetime.date.today()
+        last = len(self.COLUMNS) - 1
+        for pos in positions:
+            self.dataChanged.emit(self.index(pos, 0), self.index(pos, last), [QtCore.Qt.ForegroundRole])
+
+    def upsert_task(self, task):
+        if not task:
+            return -1
+        pos = self.row_of_task(task.get("id"))
+        if pos < 0:
+            return self.insert_task(task)
+        self.rows[pos] = dict(task)
+        self.dataChanged.emit(self.index(pos, 0), self.index(pos, len(self.COLUMNS) - 1))
+        return pos
+
+    def patch_task(self, task_id, fields):
+        # Правка на месте до записи в БД (отложенная запись) — строка сразу показывает новое
+        pos = self.row_of_task(task_id)
+        if pos < 0 or not isinstance(self.rows[pos], dict):
+            return -1
+        self.rows[pos].update(fields)
+        self.dataChanged.emit(self.index(pos, 0), self.index(pos, len(self.COLUMNS) - 1))
+        return pos
+
+    def set_versions(self, versions):
+        # Новые версии записанных задач (на отображение не влияют — без dataChanged)
+        for pos, r in enumerate(self.rows):
+            task_id = self._get_value(r, "id")
+            if task_id in versions and isinstance(r, dict):
+                r["version"] = versions[task_id]
+
+    def reload_tasks(self, task_ids):
+        # Вернуть строки к состоянию БД (запись не прошла); исчезнувшие — убрать
+        gone = []
+        for task_id in task_ids or ():
+            task = self.repo.get_task(task_id)
+            if task is None:
+                gone.append(task_id)
+            elif self.row_of_task(task_id) >= 0:
+                self.upsert_task(task)
+        self.remove_tasks(gone)
+
+    def remove_tasks(self, task_ids):
+        ids = set(task_ids or ())
+        if not ids:
+            return
+        # С конца, чтобы номера оставшихся строк не съезжали
+        for pos in range(len(self.rows) - 1, -1, -1):
+            if self._get_value(self.rows[pos], "id") in ids:
+                self.beginRemoveRows(QtCore.QModelIndex(), pos, pos)
+                del self.rows[pos]
+                self.endRemoveRows()
+    
+
+class WindowedTaskModel(TaskTableModel):
+    """
+    Модель для очень больших БД: в памяти только порядок id (8 байт на задачу)
+    и блоки строк в LRU-кэше с бюджетом памяти (app/row_cache.py). Режим фильтра,
+    поиск и сортировка — в SQL (repo.ordered_ids); прокси при такой модели работает насквозь.
+    Изменённая строка остаётся на своём месте до следующей перезагрузки порядка,
+    строка, переставшая подходить под фильтр, убирается сразу.
+    """
+    windowed = True
+
+    def __init__(self, repo, parent=None, max_bytes=DEFAULT_MAX_BYTES, block_rows=BLOCK_ROWS, mode_query=None):
+        # Кэш и условие режима нужны уже в load() из базового __init__
+        self.cache = BlockRowCache(self._fetch_block, block_rows=block_rows, max_bytes=max_bytes)
+        # Режим фильтра окна запросом (Plan из MODE_QUERIES или сохранённого вида); None — все задачи
+        self.mode_query = mode_query
+        super().__init__(repo, parent)
+        # Прокрутка перешла в другой блок — следующие по ходу читаем сразу после отрисовки
+        self._prefetch_timer = QtCore.QTimer(self)
+        self._prefetch_timer.setSingleShot(True)
+        self._prefetch_timer.setInterval(0)
+        self._prefetch_timer.timeout.connect(self.cache.prefetch)
+        self.cache.on_move = lambda block: self._prefetch_timer.start()
+        # Догруженные колонки (описание) увеличили строки — пересчитать объём их блоков
+        self.rowsFilled.connect(self.cache.remeasure)
+
+    def load(self):
+        self.beginResetModel()
+        self.today = datetime.date.today()
+        self.change_seq = self.repo.last_change_seq()
+        queries = [q for q in (self.mode_query, self.query) if q is not None]
+        self.cache.reset(self.repo.ordered_ids(self.order_by, title_contains=self.title_search, queries=queries))
+        self.rows = LazyRows(self.cache)
+        self._has_more = False
+        self._pending_fill.clear()
+        self.endResetModel()
+
+    def _fetch_block(self, ids):
+        try:
+            got = self.repo.rows_by_ids(ids, self.columns)
+        except Exception:
+            return None
+        # Задачу успели удалить — остаётся пустая строка, пока событие шины её не уберёт
+        return [got.get(task_id) or {"id": task_id} for task_id in ids]
+
+    def _accepts(self, row):
+        # Строка подходит под режим и поиск — те же условия, что ушли в SQL
+        get = row.get
+        for plan in (self.mode_query, self.query):
+            if plan is not None and not plan.matches(get, self.today):
+                return False
+        if self.title_search:
+            return fold_key(self.title_search) in (row.get("title_key") or "")
+        return True
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return False
+
+    def sort(self, column, order=QtCore.Qt.AscendingOrder):
+        if column < 0 or column >= len(self.COLUMNS):
+            return
+        key = self.COLUMNS[column][0]
+        direction = "DESC" if order == QtCore.Qt.DescendingOrder else "ASC"
+        order_by = f"{key} {direction}, id {direction}"
+        if order_by == self.order_by:
+            return
+        self.order_by = order_by
+        self.load()
+
+    # ===== Позиции по id — через порядок id, без чтения строк =====
+    def _id_at(self, pos):
+        return self.cache.ids[pos]
+
+    def _loaded_row(self, pos):
+        # Строка из вытесненного блока не нужна: блок перечитается уже с новыми значениями
+        return self.cache.cached_row(pos)
+
+    def _positions(self, task_ids):
+        return self.cache.positions_of(task_ids)
+
+    def row_of_task(self, task_id):
+        return self.cache.positions_of([task_id]).get(task_id, -1)
+
+    # ===== Точечные изменения =====
+    def insert_task(self, task):
+        # Место новой строки в порядке знает только БД — перечитываем порядок, если она видна
+        if not task or not self._accepts(task):
+            return -1
+        self.load()
+        return self.row_of_task(task.get("id"))
+
+    def remove_tasks(self, task_ids):
+        positions = sorted(self._positions(task_ids).values(), reverse=True)
+        for pos in positions:
+            self.beginRemoveRows(QtCore.QModelIndex(), pos, pos)
+            self.cache.delete(pos)
+            self.endRemoveRows()
+
+    def _replace_row(self, pos, task):
+        # Новая версия строки на её месте; не подходит под фильтр — убираем
+        if not self._accepts(task):
+            self.beginRemoveRows(QtCore.QModelIndex(), pos, pos)
+            self.cache.delete(pos)
+            self.endRemoveRows()
+            return -1
+        self.cache.set_row(pos, dict(task))
+        self.dataChanged.emit(self.index(pos, 0), self.index(pos, len(self.COLUMNS) - 1))
+        return pos
+
+    def on_task_updated(self, task_id, fields):
+        pos = self.row_of_task(task_id)
+        got = self._fetch_rows([task_id])
+        if got is None:
+            return
+        if task_id not in got:
+            self.remove_tasks([task_id])
+            return
+        task = dict(got[task_id], id=task_id)
+        if pos >= 0:
+            self._replace_row(pos, task)
+        else:
+            # Задача могла начать подходить под фильтр
+            self.insert_task(task)
+
+    def upsert_task(self, task):
+        if not task:
+            return -1
+        pos = self.row_of_task(task.get("id"))
+        if pos < 0:
+            return self.insert_task(task)
+        return self._replace_row(pos, task)
+
+    def patch_task(self, task_id, fields):
+        pos = self.row_of_task(task_id)
+        row = self.cache.cached_row(pos)
+        if not isinstance(row, dict):
+            # Строки нет в памяти — её прочитают из БД уже с записанной правкой
+            return pos
+        row.update(fields)
+        self.dataChanged.emit(self.index(pos, 0), self.index(pos, len(self.COLUMNS) - 1))
+        return pos
+
+    def set_versions(self, versions):
+        # Версии нужны только строкам в памяти — остальные прочитаются уже новыми
+        for r in self.cache.cached_rows():
+            if isinstance(r, dict) and r.get("id") in versions:
+                r["version"] = versions[r["id"]]
+
+    def sync_changes(self):
+        res = self.repo.changes_since(self.change_seq, columns=self.columns)
+        if res is None:
+            self.load()
+            return []
+        new_seq, rows, deleted = res
+        self.change_seq = new_seq
+        self.remove_tasks(deleted)
+        if not rows:
+            return []
+        pos_by_id = self._positions(task.get("id") for task in rows)
+        # Новые подходящие задачи — один раз перечитать порядок
+        if any(task.get("id") not in pos_by_id and self._accepts(task) for task in rows):
+            self.load()
+            return []
+        # С конца: убранная строка сдвигает только уже обработанные (их номера правим)
+        touched = []
+        for task in sorted(rows, key=lambda t: pos_by_id.get(t.get("id"), -1), reverse=True):
+            pos = pos_by_id.get(task.get("id"), -1)
+            if pos < 0:
+                continue
+            if self._replace_row(pos, task) >= 0:
+                touched.append(pos)
+            else:
+                touched = [p - 1 for p in touched]
+        return touched
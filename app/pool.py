@@ -0,0 +1,186 @@
+# Соединения с БД: один писатель + пул читателей (WAL позволяет читать параллельно с записью)
+
+import time
+import queue
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_READERS = 3
+# Сколько SQLite сам ждёт чужую блокировку (БД на сетевом диске у нескольких человек).
+# Запись идёт из потока GUI, поэтому ждём коротко, а дальше — повторы с паузой
+DEFAULT_BUSY_TIMEOUT_MS = 200
+# Повторы BEGIN IMMEDIATE после истечения busy_timeout: пауза растёт вдвое, со случайным разбросом
+WRITE_RETRIES = 4
+BACKOFF_BASE_SEC = 0.05
+BACKOFF_MAX_SEC = 0.4
+# Дольше этого (вместе с busy_timeout) окно не замирает: сдаёмся и сообщаем, что БД занята
+WRITE_WAIT_MAX_SEC = 2.0
+# Ожидание блокировки дольше этого считаем в статистике
+SLOW_LOCK_MS = 50
+
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """БД занята другим процессом дольше, чем мы готовы ждать (busy_timeout + повторы)."""
+
+
+def _is_busy(e):
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+
+class ConnectionManager:
+    def __init__(self, path, readers=DEFAULT_READERS, on_connect=None, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS,
+                 retries=WRITE_RETRIES):
+        self.path = str(path)
+        self.max_readers = max(1, int(readers))
+        # Настройка каждого нового соединения (PRAGMA уровня соединения)
+        self.on_connect = on_connect
+        self.busy_timeout_ms = max(0, int(busy_timeout_ms))
+        self.retries = max(0, int(retries))
+        # Счётчики ожидания блокировок (для диагностики); меняются под write_lock
+        self.lock_stats = {"writes": 0, "slow": 0, "busy_retries": 0, "busy_failures": 0,
+                           "wait_ms": 0, "max_wait_ms": 0}
+
+        # Писатель один на процесс; из разных потоков — только под замком
+        self.writer = sqlite3.connect(self.path, check_same_thread=False)
+        self.writer.row_factory = sqlite3.Row
+        self._setup(self.writer)
+        self.write_lock = threading.RLock()
+
+        self._idle = queue.LifoQueue()
+        self._all_readers = []
+        self._create_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _reader_uri(self):
+        # mode=ro: читатель физически не сможет ничего записать
+        return Path(self.path).resolve().as_uri() + "?mode=ro"
+
+    def _setup(self, conn):
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        if self.on_connect is not None:
+            self.on_connect(conn)
+
+    def begin_write(self):
+        """
+        BEGIN IMMEDIATE на писателе (вызывать под write_lock): блокировку записи берём сразу,
+        а не на первом INSERT/UPDATE — тогда "database is locked" возможен только здесь,
+        до любых изменений, и его безопасно повторить.
+        """
+        conn = self.writer
+        if conn.in_transaction:
+            return
+        stats = self.lock_stats
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                if attempt >= self.retries or time.monotonic() - started >= WRITE_WAIT_MAX_SEC:
+                    stats["busy_failures"] += 1
+                    raise DatabaseBusyError(str(e)) from e
+                stats["busy_retries"] += 1
+                # Случайный разброс — чтобы несколько клиентов не ломились одновременно
+                delay = min(BACKOFF_MAX_SEC, BACKOFF_BASE_SEC * (2 ** attempt),
+                            max(0.0, WRITE_WAIT_MAX_SEC - (time.monotonic() - started)))
+                time.sleep(random.uniform(delay / 2, delay))
+                attempt += 1
+        waited = int((time.monotonic() - started) * 1000)
+        stats["writes"] += 1
+        stats["wait_ms"] += waited
+        if waited >= SLOW_LOCK_MS:
+            stats["slow"] += 1
+        stats["max_wait_ms"] = max(stats["max_wait_ms"], waited)
+
+    def _open_reader(self):
+        conn = sqlite3.connect(self._reader_uri(), uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        self._setup(conn)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._create_lock:
+            if len(self._all_readers) < self.max_readers:
+                conn = self._open_reader()
+                self._all_readers.append(conn)
+                return conn
+        # Все заняты — ждём, пока кто-нибудь вернёт соединение
+        return self._idle.get()
+
+    @contextmanager
+    def reader(self):
+        """
+        Выдаёт read-only соединение текущему потоку.
+        Вложенные вызовы в том же потоке получают то же соединение.
+        """
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn = self._acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                self._local.conn = None
+                # Незавершённую неявную транзакцию чтения не держим — иначе WAL не сможет чекпоинтиться
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except Exception:
+                    pass
+                self._idle.put(conn)
+
+    def close_idle_readers(self):
+        """
+        Закрывает свободные читатели (при нужде откроются снова).
+        Нужно, например, чтобы выйти из WAL для смены размера страницы.
+        """
+        closed = []
+        while True:
+            try:
+                closed.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._create_lock:
+            self._all_readers = [c for c in self._all_readers if c not in closed]
+        for conn in closed:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        return len(closed)
+
+    def close(self):
+        with self._create_lock:
+            readers, self._all_readers = self._all_readers, []
+        for conn in readers:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if self.writer is not None:
+            try:
+                with self.write_lock:
+                    self.writer.close()
+            finally:
+                self.writer = None
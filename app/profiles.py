@@ -0,0 +1,61 @@
+# Профили производительности SQLite: кэш, mmap, временные данные, размер страницы
+
+import os
+
+DEFAULT_PROFILE = "default"
+# Начиная с такого размера файла БД автоматически берём профиль large-db
+LARGE_DB_BYTES = 64 * 1024 * 1024
+
+# cache_size < 0 — в КиБ (SQLite-конвенция), mmap_size — в байтах, temp_store: 0 default, 1 file, 2 memory
+PROFILES = {
+    "default": {
+        "cache_size": -8000,
+        "mmap_size": 0,
+        "temp_store": 2,
+        "page_size": 4096,
+    },
+    "large-db": {
+        "cache_size": -32000,
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": 2,
+        "page_size": 8192,
+    },
+    "low-memory": {
+        "cache_size": -1000,
+        "mmap_size": 0,
+        "temp_store": 1,
+        "page_size": 4096,
+    },
+}
+
+
+def choose_profile(path, requested=None):
+    """
+    Имя профиля: явно заданное (настройки), иначе по размеру файла БД.
+    Неизвестное имя и "auto" считаются отсутствующими.
+    """
+    name = str(requested or "").strip().lower()
+    if name in PROFILES:
+        return name
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    return "large-db" if size >= LARGE_DB_BYTES else DEFAULT_PROFILE
+
+
+def is_explicit(requested):
+    # Профиль выбран в настройках по имени (а не "auto"/пусто)
+    return str(requested or "").strip().lower() in PROFILES
+
+
+def apply_profile(conn, name):
+    # Настройки уровня соединения — выставляются каждому писателю и читателю
+    p = PROFILES.get(name) or PROFILES[DEFAULT_PROFILE]
+    conn.execute(f"PRAGMA cache_size = {int(p['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(p['mmap_size'])}").fetchall()
+    conn.execute(f"PRAGMA temp_store = {int(p['temp_store'])}")
+
+
+def profile_page_size(name):
+    return (PROFILES.get(name) or PROFILES[DEFAULT_PROFILE])["page_size"]
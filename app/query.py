@@ -0,0 +1,224 @@
+# Язык запросов строки поиска: due<today prio>=5 done:no "отчёт" -> параметризованный SQL по tasks
+
+import re
+import datetime
+import functools
+
+from app.db import fold_key
+
+
+class QueryError(ValueError):
+    """Запрос не разобран или слишком дорогой; текст — для пользователя."""
+
+
+# Поле запроса -> (колонка, тип значения, индекс под колонку)
+FIELDS = {
+    "due": ("due_date", "date", "idx_tasks_due"),
+    "created": ("created_at", "date", "idx_tasks_created"),
+    "prio": ("priority", "int", "idx_tasks_priority"),
+    "done": ("completed", "bool", "idx_tasks_completed"),
+    "title": ("title_key", "prefix", "idx_tasks_title_key"),
+    "desc": ("description", "text", None),
+}
+ALIASES = {
+    "priority": "prio", "срок": "due", "приоритет": "prio", "создано": "created",
+    "готово": "done", "выполнено": "done", "название": "title", "описание": "desc",
+}
+OPS = ("<=", ">=", "!=", "<", ">", "=", ":")
+
+_TOKEN = re.compile(r'"([^"]*)"?|(\w+)\s*(<=|>=|!=|<|>|=|:)\s*("[^"]*"?|[^\s"]*)|(\S+)')
+_FIELD_OP = re.compile(r"(\w+)\s*(?:<=|>=|!=|<|>|=|:)")
+_REL_DATE = re.compile(r"(today|tomorrow|yesterday|сегодня|завтра|вчера)([+-]\d+)?$")
+_REL_BASE = {"today": 0, "сегодня": 0, "tomorrow": 1, "завтра": 1, "yesterday": -1, "вчера": -1}
+_TRUE = ("yes", "y", "1", "true", "да")
+_FALSE = ("no", "n", "0", "false", "нет")
+_PY_OPS = {
+    "<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b, "=": lambda a, b: a == b, "!=": lambda a, b: a != b,
+}
+
+# Сколько разобранных запросов держать (ключ — строка запроса)
+PLAN_CACHE_SIZE = 128
+
+# Режимы фильтра окна (MODES в app/index_proxy.py) запросом — когда фильтрует БД (оконная модель)
+MODE_QUERIES = {
+    "Открытые": "done:no",
+    "Просроченные": "done:no due<today",
+    "На сегодня": "done:no due=today",
+    "Выполненные": "done:yes",
+}
+
+
+class RelDate:
+    """Дата относительно сегодняшней: в кэше план живёт дольше суток."""
+    __slots__ = ("days",)
+
+    def __init__(self, days):
+        self.days = days
+
+    def resolve(self, today):
+        return (today + datetime.timedelta(days=self.days)).isoformat()
+
+    def __repr__(self):
+        return f"RelDate({self.days:+d})"
+
+
+class Plan:
+    """
+    Разобранный запрос: where/params — для SQL (все условия через AND),
+    terms — те же условия для проверки строки в памяти, warnings — что пойдёт без индекса.
+    """
+    __slots__ = ("text", "where", "params", "terms", "warnings")
+
+    def __init__(self, text, where, params, terms, warnings):
+        self.text = text
+        self.where = where
+        self.params = tuple(params)
+        self.terms = tuple(terms)
+        self.warnings = tuple(warnings)
+
+    def bind(self, today=None):
+        # Относительные даты подставляются в момент выполнения
+        today = today or datetime.date.today()
+        return [p.resolve(today) if isinstance(p, RelDate) else p for p in self.params]
+
+    def relative_dates(self):
+        # (колонка, сдвиг в днях) условий с относительной датой — их ответ меняется со сменой даты
+        return [(column, value.days) for column, _, value in self.terms if isinstance(value, RelDate)]
+
+    def matches(self, get, today=None):
+        """
+        То же условие для строки в памяти; get(колонка) -> значение.
+        Нужно для точечных изменений, когда строку не хочется перечитывать из БД.
+        """
+        today = today or datetime.date.today()
+        for column, op, value in self.terms:
+            if isinstance(value, RelDate):
+                value = value.resolve(today)
+            current = get(column)
+            if op == "prefix":
+                ok = (current or "").startswith(value)
+            elif op == "contains":
+                ok = value in (current or "")
+            elif column in ("priority", "completed"):
+                try:
+                    current = int(current or 0)
+                except Exception:
+                    current = 0
+                if column == "completed":
+                    current = int(bool(current))
+                ok = _PY_OPS[op](current, value)
+            else:
+                ok = _PY_OPS[op]("" if current is None else str(current), value)
+            if not ok:
+                return False
+        return True
+
+
+def _field(name):
+    name = name.casefold()
+    name = ALIASES.get(name, name)
+    return name if name in FIELDS else None
+
+
+def is_structured(text):
+    """True — в строке есть «поле оператор …» с известным полем (иначе это обычный поиск)."""
+    return any(_field(m.group(1)) for m in _FIELD_OP.finditer(text or ""))
+
+
+def _parse_date(raw):
+    m = _REL_DATE.match(raw.casefold())
+    if m:
+        return RelDate(_REL_BASE[m.group(1)] + int(m.group(2) or 0))
+    try:
+        return datetime.date.fromisoformat(raw).isoformat()
+    except ValueError:
+        raise QueryError(f"Не дата: {raw} (ожидается ГГГГ-ММ-ДД или today, today+3, yesterday)")
+
+
+def _parse_value(kind, op, raw, name):
+    if raw.startswith('"'):
+        raw = raw.strip('"')
+    if not raw:
+        raise QueryError(f"Нет значения после {name}{op}")
+    if kind == "date":
+        return _parse_date(raw)
+    if kind == "int":
+        try:
+            return int(raw)
+        except ValueError:
+            raise QueryError(f"Не число: {raw}")
+    if kind == "bool":
+        low = raw.casefold()
+        if low in _TRUE:
+            return 1
+        if low in _FALSE:
+            return 0
+        raise QueryError(f"{name}: ожидается yes/no, получено {raw}")
+    return fold_key(raw)
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile(text):
+    conds, params, terms, warnings = [], [], [], []
+    for m in _TOKEN.finditer(text):
+        phrase, name, op, raw, word = m.groups()
+        if name is not None and _field(name) is None:
+            # Неизвестное поле — считаем обычным словом (например, «время:10»)
+            word, name = m.group(0), None
+        if name is None:
+            key = fold_key(phrase if phrase is not None else word)
+            if not key:
+                continue
+            conds.append("instr(title_key, ?) > 0")
+            params.append(key)
+            terms.append(("title_key", "contains", key))
+            warnings.append(f"«{key}» — поиск подстроки в названии без индекса")
+            continue
+
+        field = _field(name)
+        column, kind, index = FIELDS[field]
+        if index is None:
+            # Описания длинные и частью лежат сжатыми в task_bodies — SQL их не просмотрит
+            raise QueryError(f"{name}: поиск по описанию в запросе слишком дорогой — "
+                             f"наберите текст без полей, его ищет индекс в памяти")
+        if op == ":":
+            op = "="
+        if kind in ("bool", "prefix") and op not in ("=", "!="):
+            raise QueryError(f"{name}: допустимы только : = !=")
+        value = _parse_value(kind, op, raw, name)
+
+        if kind == "prefix":
+            if op == "!=":
+                raise QueryError(f"{name}: отрицание по названию не поддерживается")
+            # Диапазон по индексу вместо LIKE: LIKE кириллицу не сворачивает
+            conds.append("title_key >= ? AND title_key < ?")
+            params += [value, value + "\U0010ffff"]
+            terms.append((column, "prefix", value))
+            continue
+
+        conds.append(f"{column} {op} ?")
+        params.append(value)
+        terms.append((column, op, value))
+        if op == "!=":
+            warnings.append(f"{name}!= — индекс {index} для отрицания не используется")
+
+    if not conds:
+        raise QueryError("Пустой запрос")
+    # Без единого индексируемого условия всё равно будет полный просмотр — предупреждаем один раз
+    if len(warnings) == len(conds):
+        warnings.append("нет условий по индексу (due, prio, done, created, title) — полный просмотр таблицы")
+    return Plan(text, " AND ".join(f"({c})" for c in conds), params, terms, warnings)
+
+
+def compile_query(text):
+    """
+    Строка поиска -> Plan. Планы кэшируются по строке (LRU на PLAN_CACHE_SIZE);
+    относительные даты в кэше хранятся как RelDate и вычисляются при bind().
+    QueryError — синтаксис, значение или дорогое условие (desc:).
+    """
+    return _compile(" ".join((text or "").split()))
+
+
+def plan_cache_info():
+    return _compile.cache_info()
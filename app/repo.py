@@ -1,41 +1,196 @@
 # # Работа с базой данных
 
 import sqlite3
+import datetime
+import itertools
+from array import array
 from contextlib import contextmanager
 from app.paths import db_path
+from app.pool import ConnectionManager, DEFAULT_READERS, DEFAULT_BUSY_TIMEOUT_MS
+from app.profiles import choose_profile, apply_profile, profile_page_size
+from app.archive import ARCHIVE_ALIAS, archive_path_for, attach_archive
+from app import changes
+from app.query import compile_query
+from app.db import fold_key, split_description, pack_body, unpack_body, ALL_COLUMNS, TASK_COLUMNS
+# Нужны всегда: идентификация, версия для записи, фильтры, раскраска, поиск
+REQUIRED_COLUMNS = ("id", "version", "due_date", "completed", "title_key")
+# Тяжёлые колонки: в списки не попадают, догружаются пачками по требованию (get_columns)
+LAZY_COLUMNS = ("description",)
+# По сколько id читать за раз при построении порядка оконной модели
+IDS_FETCH_CHUNK = 50000
+
+
+def _attach_bodies(cur, rows):
+    """
+    Длинные описания лежат в task_bodies (в tasks.description для них NULL) —
+    подставляем полный текст в строки, где описание запрошено.
+    Архивные строки (archived=1) берут тело из архива.
+    """
+    wanted = {}
+    for r in rows:
+        if "description" in r and r["description"] is None:
+            schema = ARCHIVE_ALIAS if r.get("archived") else "main"
+            wanted.setdefault(schema, []).append(r["id"])
+    if not wanted:
+        return rows
+    bodies = {}
+    for schema, ids in wanted.items():
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            marks = ", ".join("?" * len(chunk))
+            cur.execute(f"SELECT task_id, body, zipped FROM {schema}.task_bodies WHERE task_id IN ({marks})", chunk)
+            for task_id, body, zipped in cur.fetchall():
+                bodies[task_id] = unpack_body(body, zipped)
+    for r in rows:
+        if r["id"] in bodies:
+            r["description"] = bodies[r["id"]]
+    return rows
+
+
+class ConflictError(Exception):
+    """
+    Задачу успели изменить/удалить другим окном, процессом или скриптом:
+    версия в БД не совпала с ожидаемой. current_version — None, если задачи уже нет.
+    """
+    def __init__(self, task_id, expected_version, current_version=None):
+        super().__init__(f"task {task_id}: expected version {expected_version}, found {current_version}")
+        self.task_id = task_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def _archive_select(columns):
+    # В архиве версии нет (задачи там только читаются)
+    return ", ".join("0 AS version" if c == "version" else c for c in columns)
+
+
+def projection(columns=None):
+    """
+    SQL-список колонок для выборки. columns=None — все колонки,
+    иначе обязательные + запрошенные, без ленивых.
+    """
+    if columns is None:
+        return TASK_COLUMNS
+    wanted = set(REQUIRED_COLUMNS) | {c for c in columns if c in ALL_COLUMNS and c not in LAZY_COLUMNS}
+    return ", ".join(c for c in ALL_COLUMNS if c in wanted)
 
 class TaskRepo:
-    def __init__(self, path=None):
+    def __init__(self, path=None, readers=DEFAULT_READERS, profile=None, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS):
         self.path = str(path or db_path())
-        self.conn = sqlite3.connect(self.path)
-        self.conn.row_factory = sqlite3.Row
+        # Профиль производительности: из настроек или по размеру БД (см. app/profiles.py)
+        self.profile = choose_profile(self.path, profile)
+        # Один писатель (self.conn) + пул read-only соединений для чтения из любых потоков
+        self.db = ConnectionManager(self.path, readers=readers,
+                                    on_connect=lambda c: apply_profile(c, self.profile),
+                                    busy_timeout_ms=busy_timeout_ms)
+        self.conn = self.db.writer
+        self.archive_path = archive_path_for(self.path)
         # Включаем целостность и адекватный журнал
         self.conn.execute("PRAGMA foreign_keys = ON")
         self.conn.execute("PRAGMA journal_mode = WAL")
         self.conn.execute("PRAGMA synchronous = NORMAL")
+        # Подписчики на изменения (ChangeEvent); события копятся до коммита
+        self._listeners = []
+        self._tx_events = []
+        # Растёт с каждым опубликованным изменением (свои записи и чужие через data_version);
+        # по нему сбрасываются кэши результатов выборок (app/result_cache.py)
+        self.change_counter = 0
+        self._change_ticks = itertools.count(1)
+
+    # ===== События изменений =====
+    def subscribe(self, callback):
+        """
+        callback(event: ChangeEvent) — зовётся после коммита, в потоке, который писал.
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        try:
+            self._listeners.remove(callback)
+        except ValueError:
+            pass
+
+    def publish(self, event):
+        self.change_counter = next(self._change_ticks)
+        for callback in list(self._listeners):
+            try:
+                callback(event)
+            except Exception:
+                pass
+
+    def _record(self, event):
+        # Внутри transaction(): уйдёт подписчикам только если транзакция закоммитится
+        self._tx_events.append(event)
+
+    def diagnostics(self):
+        """
+        Текущие параметры БД для окна диагностики: профиль и фактические PRAGMA.
+        """
+        with self.db.write_lock:
+            pragma = lambda name: self.conn.execute(f"PRAGMA {name}").fetchone()[0]
+            info = {
+                "profile": self.profile,
+                "page_size": pragma("page_size"),
+                "page_size_wanted": profile_page_size(self.profile),
+                "page_count": pragma("page_count"),
+                "cache_size": pragma("cache_size"),
+                "mmap_size": pragma("mmap_size"),
+                "temp_store": pragma("temp_store"),
+                "journal_mode": pragma("journal_mode"),
+                "synchronous": pragma("synchronous"),
+            }
+            info["busy_timeout_ms"] = pragma("busy_timeout")
+            info.update({f"lock_{k}": v for k, v in self.db.lock_stats.items()})
+        info["db_bytes"] = info["page_size"] * info["page_count"]
+        return info
 
     def close(self):
         if getattr(self, "conn", None):
             try:
-                self.conn.close()
+                self.db.close()
             finally:
                 self.conn = None
 
     @contextmanager
     def transaction(self):
-        cur = self.conn.cursor()
-        try:
-            yield cur
-        except Exception:
-            self.conn.rollback()
-            raise
-        else:
-            self.conn.commit()
-        finally:
-            cur.close()
+        # Писатель общий для всех потоков — записи идут строго по одной
+        with self.db.write_lock:
+            # BEGIN IMMEDIATE с повторами; не дождались — DatabaseBusyError до любых изменений
+            self.db.begin_write()
+            cur = self.conn.cursor()
+            try:
+                yield cur
+            except Exception:
+                self.conn.rollback()
+                self._tx_events = []
+                raise
+            else:
+                self.conn.commit()
+                events, self._tx_events = self._tx_events, []
+            finally:
+                cur.close()
+        # Подписчиков зовём уже без замка писателя
+        for event in events:
+            self.publish(event)
 
-    def list_tasks(self, order_by="due_date ASC, priority DESC, id DESC"):
-        allowed_cols = {"id", "title", "description", "due_date", "created_at", "completed", "priority"}
+    def reader(self):
+        # Для долгих чтений (экспорт, статистика, поиск) — в том числе из рабочих потоков
+        return self.db.reader()
+
+    # Выражения сортировки: ключ колонки -> SQL (под каждое есть индекс)
+    SORT_EXPR = {
+        "id": "id",
+        "title": "title_key",
+        "description": "desc_preview",
+        "due_date": "due_date",
+        "created_at": "created_at",
+        "completed": "completed",
+        "priority": "priority",
+    }
+
+    def _order_clauses(self, order_by):
         clauses = []
         for part in (order_by or "").split(","):
             part = part.strip()
@@ -44,70 +199,466 @@ class TaskRepo:
             bits = part.split()
             col = bits[0]
             direction = bits[1].upper() if len(bits) > 1 else "ASC"
-            if col in allowed_cols and direction in ("ASC", "DESC"):
-                clauses.append(f"{col} {direction}")
+            if col in self.SORT_EXPR and direction in ("ASC", "DESC"):
+                clauses.append(f"{self.SORT_EXPR[col]} {direction}")
         if not clauses:
             clauses = ["due_date ASC", "priority DESC", "id DESC"]
+        return clauses
 
-        sql = f"""
-            SELECT id, title, description, due_date, created_at, completed, priority
-            FROM tasks
-            ORDER BY {", ".join(clauses)}
+    def _archive_view(self, conn):
+        """
+        Подключает архив к read-only соединению и заводит TEMP VIEW tasks_all
+        (основная таблица + архив). False — архива ещё нет.
         """
-        cur = self.conn.cursor()
         try:
-            cur.execute(sql)
-            return [dict(r) for r in cur.fetchall()]
-        finally:
-            cur.close()
+            if not attach_archive(conn, self.archive_path, read_only=True):
+                return False
+            conn.execute(f"""
+                CREATE TEMP VIEW IF NOT EXISTS tasks_all AS
+                SELECT {TASK_COLUMNS}, 0 AS archived FROM main.tasks
+                UNION ALL
+                SELECT {_archive_select(ALL_COLUMNS)}, 1 AS archived FROM {ARCHIVE_ALIAS}.tasks
+            """)
+            return True
+        except sqlite3.Error:
+            return False
+
+    def list_tasks(self, order_by="due_date ASC, priority DESC, id DESC", limit=None, offset=0,
+                   title_contains=None, title_prefix=None, columns=None, include_archive=False, query=None):
+        """
+        include_archive=True — только выполненные, вместе с архивом (поле archived).
+        query — Plan из app/query.py (запрос строки поиска), добавляется к условиям через AND.
+        """
+        clauses = self._order_clauses(order_by)
+        conds, params = [], []
+        if title_prefix:
+            # Диапазон по индексу idx_tasks_title_key
+            key = fold_key(title_prefix)
+            conds.append("title_key >= ? AND title_key < ?")
+            params += [key, key + "\U0010ffff"]
+        if title_contains:
+            conds.append("instr(title_key, ?) > 0")
+            params.append(fold_key(title_contains))
+        if query is not None:
+            conds.append(query.where)
+            params += query.bind()
+        if limit is not None:
+            params += [int(limit), max(0, int(offset or 0))]
+        with self.db.reader() as conn:
+            source, select = "tasks", projection(columns)
+            if include_archive and self._archive_view(conn):
+                source, select = "temp.tasks_all", select + ", archived"
+                conds.insert(0, "completed = 1")
+            where = ("WHERE " + " AND ".join(conds)) if conds else ""
+            sql = f"""
+                SELECT {select}
+                FROM {source}
+                {where}
+                ORDER BY {", ".join(clauses)}
+            """
+            if limit is not None:
+                sql += " LIMIT ? OFFSET ?"
+            cur = conn.cursor()
+            try:
+                cur.execute(sql, params)
+                return _attach_bodies(cur, [dict(r) for r in cur.fetchall()])
+            finally:
+                cur.close()
+
+    def query_ids(self, query, include_archive=False):
+        """
+        id задач, подходящих под запрос (Plan) — по индексам, без загрузки строк.
+        """
+        with self.db.reader() as conn:
+            source = "tasks"
+            if include_archive and self._archive_view(conn):
+                source = "temp.tasks_all"
+            cur = conn.cursor()
+            try:
+                cur.execute(f"SELECT id FROM {source} WHERE {query.where}", query.bind())
+                return {r[0] for r in cur.fetchall()}
+            finally:
+                cur.close()
+
+    # ===== Оконная модель (очень большие БД) =====
+    def count_tasks(self):
+        # Всего задач — по агрегатам task_counts, без прохода по таблице
+        with self.db.reader() as conn:
+            return conn.execute("SELECT COALESCE(SUM(n), 0) FROM task_counts").fetchone()[0]
+
+    def ordered_ids(self, order_by="due_date ASC, priority DESC, id DESC", title_contains=None, queries=()):
+        """
+        id задач в порядке показа — индекс строк оконной модели (array 'q', 8 байт на задачу).
+        Условия — как у list_tasks: подстрока названия и запросы (Plan), всё через AND.
+        """
+        clauses = self._order_clauses(order_by)
+        conds, params = [], []
+        if title_contains:
+            conds.append("instr(title_key, ?) > 0")
+            params.append(fold_key(title_contains))
+        for query in queries or ():
+            conds.append(query.where)
+            params += query.bind()
+        where = ("WHERE " + " AND ".join(conds)) if conds else ""
+        ids = array("q")
+        with self.db.reader() as conn:
+            cur = conn.cursor()
+            # Кортежи вместо sqlite3.Row: на миллионах id это половина времени
+            cur.row_factory = None
+            try:
+                cur.execute(f"SELECT id FROM tasks {where} ORDER BY {', '.join(clauses)}", params)
+                while True:
+                    chunk = cur.fetchmany(IDS_FETCH_CHUNK)
+                    if not chunk:
+                        break
+                    ids.extend(r[0] for r in chunk)
+            finally:
+                cur.close()
+        return ids
+
+    def rows_by_ids(self, task_ids, columns=None):
+        """
+        Строки по списку id (блок оконной модели): {id: строка} в проекции columns.
+        Плотные id (сортировка по id, свежие задачи подряд) читаются одним окном по rowid
+        (id BETWEEN), разреженные — пачками IN (...) — тоже поиском по rowid.
+        """
+        ids = [int(t) for t in (task_ids or ())]
+        if not ids:
+            return {}
+        select = projection(columns)
+        lo, hi = min(ids), max(ids)
+        rows = []
+        with self.db.reader() as conn:
+            cur = conn.cursor()
+            try:
+                if hi - lo < 2 * len(ids):
+                    cur.execute(f"SELECT {select} FROM tasks WHERE id BETWEEN ? AND ?", (lo, hi))
+                    rows.extend(dict(r) for r in cur.fetchall())
+                else:
+                    for i in range(0, len(ids), 500):
+                        chunk = ids[i:i + 500]
+                        marks = ", ".join("?" * len(chunk))
+                        cur.execute(f"SELECT {select} FROM tasks WHERE id IN ({marks})", chunk)
+                        rows.extend(dict(r) for r in cur.fetchall())
+            finally:
+                cur.close()
+        wanted = set(ids)
+        return {r["id"]: r for r in rows if r["id"] in wanted}
+
+    def _write_body(self, cur, task_id, body):
+        if body is None:
+            cur.execute("DELETE FROM task_bodies WHERE task_id = ?", (int(task_id),))
+        else:
+            blob, zipped = pack_body(body)
+            cur.execute("INSERT OR REPLACE INTO task_bodies(task_id, body, zipped) VALUES (?, ?, ?)",
+                        (int(task_id), blob, zipped))
 
     def add_task(self, title, description, due_date, priority=0):
         sql = """
-            INSERT INTO tasks(title, description, due_date, created_at, completed, priority)
-            VALUES (?, ?, ?, DATE('now'), 0, ?)
+            INSERT INTO tasks(title, description, due_date, created_at, completed, priority, title_key, desc_preview)
+            VALUES (?, ?, ?, DATE('now'), 0, ?, ?, ?)
         """
+        desc, preview, body = split_description(description)
         with self.transaction() as cur:
-            cur.execute(sql, (title, description, due_date, int(priority)))
-            return cur.lastrowid
+            cur.execute(sql, (title, desc, due_date, int(priority), fold_key(title), preview))
+            task_id = cur.lastrowid
+            if body is not None:
+                self._write_body(cur, task_id, body)
+            self._record(changes.inserted(task_id))
+        return task_id
+
+    def _check_version(self, cur, task_id, expected_version):
+        # Запись не прошла: задачи нет или версия уже другая
+        cur.execute("SELECT version FROM tasks WHERE id = ?", (int(task_id),))
+        row = cur.fetchone()
+        current = row[0] if row else None
+        if expected_version is not None and current != expected_version:
+            raise ConflictError(task_id, expected_version, current)
+
+    def update_task(self, task_id, title=None, description=None, due_date=None, completed=None, priority=None,
+                    expected_version=None):
+        """
+        expected_version — версия, которую видел пользователь; если в БД уже другая
+        (или задачи нет), бросается ConflictError и ничего не пишется.
+        """
+        fields = {"title": title, "description": description, "due_date": due_date,
+                  "completed": completed, "priority": priority}
+        with self.transaction() as cur:
+            return self._update_row(cur, task_id, fields, expected_version)
+
+    # Поля, которые можно менять у задачи (None — не трогать)
+    UPDATABLE = ("title", "description", "due_date", "completed", "priority")
 
-    def update_task(self, task_id, title=None, description=None, due_date=None, completed=None, priority=None):
+    def _update_row(self, cur, task_id, fields, expected_version=None):
         parts, params = [], []
+        title = fields.get("title")
+        description = fields.get("description")
 
         if title is not None:
             parts.append("title = ?"); params.append(title)
+            parts.append("title_key = ?"); params.append(fold_key(title))
+        body = None
         if description is not None:
-            parts.append("description = ?"); params.append(description)
-        if due_date is not None:
-            parts.append("due_date = ?"); params.append(due_date)
-        if completed is not None:
-            parts.append("completed = ?"); params.append(1 if completed else 0)
-        if priority is not None:
-            parts.append("priority = ?"); params.append(int(priority))
+            desc, preview, body = split_description(description)
+            parts.append("description = ?"); params.append(desc)
+            parts.append("desc_preview = ?"); params.append(preview)
+        if fields.get("due_date") is not None:
+            parts.append("due_date = ?"); params.append(fields["due_date"])
+        if fields.get("completed") is not None:
+            done = 1 if fields["completed"] else 0
+            # Дата выполнения — только при переходе в «выполнено» (повторная отметка её не сдвигает)
+            parts.append("completed_at = CASE WHEN ? = 0 THEN NULL WHEN completed = 0 THEN DATE('now') "
+                         "ELSE completed_at END"); params.append(done)
+            parts.append("completed = ?"); params.append(done)
+        if fields.get("priority") is not None:
+            parts.append("priority = ?"); params.append(int(fields["priority"]))
 
         if not parts:
             return False
 
+        parts.append("version = version + 1")
+        where = "id = ?"
         params.append(int(task_id))
-        sql = f"UPDATE tasks SET {', '.join(parts)} WHERE id = ?"
+        if expected_version is not None:
+            where += " AND version = ?"
+            params.append(int(expected_version))
+        cur.execute(f"UPDATE tasks SET {', '.join(parts)} WHERE {where}", params)
+        changed = cur.rowcount > 0
+        if not changed:
+            self._check_version(cur, task_id, expected_version)
+        if changed and description is not None:
+            self._write_body(cur, task_id, body)
+        if changed:
+            self._record(changes.updated(task_id, [k for k in self.UPDATABLE if fields.get(k) is not None]))
+        return changed
+
+    def apply_updates(self, updates):
+        """
+        Групповая запись: [(task_id, {поле: значение}, expected_version), ...] одной транзакцией.
+        Конфликт версии по одной задаче не мешает остальным.
+        Возвращает ({task_id: новая версия}, {task_id: ConflictError}).
+        Любая другая ошибка откатывает всю пачку и пробрасывается.
+        """
+        versions, conflicts = {}, {}
         with self.transaction() as cur:
-            cur.execute(sql, params)
-            return cur.rowcount > 0
+            for task_id, fields, expected_version in updates:
+                try:
+                    if not self._update_row(cur, task_id, fields, expected_version):
+                        continue
+                except ConflictError as e:
+                    conflicts[task_id] = e
+                    continue
+                cur.execute("SELECT version FROM tasks WHERE id = ?", (int(task_id),))
+                row = cur.fetchone()
+                if row:
+                    versions[task_id] = row[0]
+        return versions, conflicts
+
+    def delete_task(self, task_id, expected_version=None):
+        with self.transaction() as cur:
+            if expected_version is None:
+                cur.execute("DELETE FROM tasks WHERE id = ?", (int(task_id),))
+            else:
+                cur.execute("DELETE FROM tasks WHERE id = ? AND version = ?", (int(task_id), int(expected_version)))
+            deleted = cur.rowcount > 0
+            if not deleted:
+                self._check_version(cur, task_id, expected_version)
+            else:
+                self._record(changes.deleted([task_id]))
+            return deleted
+
+    # ===== Счётчики (таблица task_counts, ведётся триггерами) =====
+    def task_counts(self, today=None):
+        """
+        {"open", "overdue", "today", "done"} одним запросом по агрегатам (строка на дату срока).
+        today — дата для просроченных/сегодняшних (по умолчанию текущая).
+        """
+        today = (today or datetime.date.today()).isoformat()
+        with self.db.reader() as conn:
+            row = conn.execute("""
+                SELECT
+                    COALESCE(SUM(CASE WHEN completed = 0 THEN n END), 0),
+                    COALESCE(SUM(CASE WHEN completed = 0 AND due_date < ? THEN n END), 0),
+                    COALESCE(SUM(CASE WHEN completed = 0 AND due_date = ? THEN n END), 0),
+                    COALESCE(SUM(CASE WHEN completed = 1 THEN n END), 0)
+                FROM task_counts
+            """, (today, today)).fetchone()
+        return {"open": row[0], "overdue": row[1], "today": row[2], "done": row[3]}
+
+    def task_ids_in_date_ranges(self, ranges):
+        """
+        id задач, у которых дата в одном из диапазонов [(колонка, с, по)] (ISO, включительно).
+        Колонки — due_date / created_at: каждый диапазон — поиск по своему индексу.
+        """
+        ids = set()
+        with self.db.reader() as conn:
+            for column, lo, hi in ranges:
+                if column not in ("due_date", "created_at"):
+                    continue
+                rows = conn.execute(f"SELECT id FROM tasks WHERE {column} BETWEEN ? AND ?", (lo, hi)).fetchall()
+                ids.update(r[0] for r in rows)
+        return ids
 
-    def delete_task(self, task_id):
+    # ===== Сохранённые виды =====
+    def list_views(self):
+        with self.db.reader() as conn:
+            rows = conn.execute("""
+                SELECT id, name, query, sort_key, sort_desc
+                FROM saved_views
+                ORDER BY position, id
+            """).fetchall()
+            return [dict(r) for r in rows]
+
+    def save_view(self, name, query, sort_key="", sort_desc=False):
+        """
+        Создаёт вид или перезаписывает вид с тем же именем; возвращает его id.
+        Запрос проверяется разбором — QueryError, если он не годится.
+        """
+        name = (name or "").strip()
+        if not name:
+            raise ValueError("view name is empty")
+        compile_query(query)
+        sort_key = sort_key if sort_key in self.SORT_EXPR else ""
+        with self.transaction() as cur:
+            cur.execute("UPDATE saved_views SET query = ?, sort_key = ?, sort_desc = ? WHERE name = ?",
+                        (query, sort_key, 1 if sort_desc else 0, name))
+            if cur.rowcount:
+                cur.execute("SELECT id FROM saved_views WHERE name = ?", (name,))
+                return cur.fetchone()[0]
+            cur.execute("""
+                INSERT INTO saved_views(name, query, sort_key, sort_desc, position)
+                VALUES (?, ?, ?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM saved_views))
+            """, (name, query, sort_key, 1 if sort_desc else 0))
+            return cur.lastrowid
+
+    def delete_view(self, view_id):
         with self.transaction() as cur:
-            cur.execute("DELETE FROM tasks WHERE id = ?", (int(task_id),))
+            cur.execute("DELETE FROM saved_views WHERE id = ?", (int(view_id),))
             return cur.rowcount > 0
 
-    def get_task(self, task_id):
-        cur = self.conn.cursor()
+    # ===== Изменения из других процессов =====
+    def data_version(self):
+        # Меняется, только когда коммитит другое соединение (другой процесс/скрипт)
+        with self.db.write_lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_change_seq(self):
+        with self.db.reader() as conn:
+            row = conn.execute("SELECT MAX(seq) FROM task_changes").fetchone()
+            return row[0] or 0
+
+    def changes_since(self, seq, columns=None):
+        """
+        Изменения после seq: (new_seq, rows, deleted_ids).
+        rows — актуальные строки вставленных/изменённых задач.
+        None — журнал уже подрезан дальше seq, нужна полная перезагрузка.
+        """
+        seq = int(seq or 0)
+        with self.db.reader() as conn:
+            return self._changes_since(conn, seq, columns)
+
+    def _changes_since(self, conn, seq, columns=None):
+        cur = conn.cursor()
         try:
+            # Один снимок на журнал и строки (соединение read-only, откат в finally)
+            cur.execute("BEGIN")
+            cur.execute("SELECT MIN(seq), MAX(seq) FROM task_changes")
+            lo, hi = cur.fetchone()
+            if hi is None or hi <= seq:
+                return seq, [], []
+            if lo is not None and seq < lo - 1:
+                return None
+
+            # Последняя операция по каждой задаче
             cur.execute("""
-                SELECT id, title, description, due_date, created_at, completed, priority
-                FROM tasks
-                WHERE id = ?
-            """, (int(task_id),))
-            row = cur.fetchone()
-            return dict(row) if row else None
+                SELECT task_id, op FROM task_changes
+                WHERE seq > ? AND seq <= ?
+                ORDER BY seq
+            """, (seq, hi))
+            last_op = {}
+            for task_id, op in cur.fetchall():
+                last_op[task_id] = op
+
+            deleted = [tid for tid, op in last_op.items() if op == "D"]
+            alive = [tid for tid, op in last_op.items() if op != "D"]
+            rows = []
+            for i in range(0, len(alive), 500):
+                chunk = alive[i:i + 500]
+                marks = ", ".join("?" * len(chunk))
+                cur.execute(f"""
+                    SELECT {projection(columns)}
+                    FROM tasks
+                    WHERE id IN ({marks})
+                """, chunk)
+                rows.extend(dict(r) for r in cur.fetchall())
+            _attach_bodies(cur, rows)
+
+            # Задача могла исчезнуть уже после чтения журнала — считаем удалённой
+            found = {r["id"] for r in rows}
+            deleted.extend(tid for tid in alive if tid not in found)
+            return hi, rows, deleted
         finally:
             cur.close()
+            if conn.in_transaction:
+                conn.rollback()
+
+    def get_task(self, task_id):
+        with self.db.reader() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(f"""
+                    SELECT {TASK_COLUMNS}
+                    FROM tasks
+                    WHERE id = ?
+                """, (int(task_id),))
+                row = cur.fetchone()
+                if row is None and self._archive_view(conn):
+                    # Задача могла уже переехать в архив
+                    cur.execute(f"""
+                        SELECT {_archive_select(ALL_COLUMNS)}, 1 AS archived
+                        FROM {ARCHIVE_ALIAS}.tasks
+                        WHERE id = ?
+                    """, (int(task_id),))
+                    row = cur.fetchone()
+                return _attach_bodies(cur, [dict(row)])[0] if row else None
+            finally:
+                cur.close()
 
+    def get_columns(self, task_ids, columns):
+        """
+        Пачкой догружает колонки для списка задач: {id: {колонка: значение}}.
+        Для ленивых колонок (описание) — только для реально отрисованных строк.
+        """
+        cols = [c for c in (columns or ()) if c in ALL_COLUMNS and c != "id"]
+        ids = [int(t) for t in (task_ids or ())]
+        if not cols or not ids:
+            return {}
+        result = {}
+        select = ", ".join(["id"] + cols)
+        rows = []
+        with self.db.reader() as conn:
+            cur = conn.cursor()
+            try:
+                for i in range(0, len(ids), 500):
+                    chunk = ids[i:i + 500]
+                    marks = ", ".join("?" * len(chunk))
+                    cur.execute(f"SELECT {select} FROM tasks WHERE id IN ({marks})", chunk)
+                    rows.extend(dict(r) for r in cur.fetchall())
+                # Не нашлись в основной таблице — ищем в архиве
+                found = {d["id"] for d in rows}
+                missing = [t for t in ids if t not in found]
+                if missing and self._archive_view(conn):
+                    for i in range(0, len(missing), 500):
+                        chunk = missing[i:i + 500]
+                        marks = ", ".join("?" * len(chunk))
+                        cur.execute(f"SELECT {_archive_select(['id'] + cols)}, 1 AS archived "
+                                    f"FROM {ARCHIVE_ALIAS}.tasks WHERE id IN ({marks})", chunk)
+                        rows.extend(dict(r) for r in cur.fetchall())
+                _attach_bodies(cur, rows)
+                for d in rows:
+                    d.pop("archived", None)
+                for d in rows:
+                    result[d.pop("id")] = d
+            finally:
+                cur.close()
+        return result
@@ -0,0 +1,85 @@
+# LRU-кэш результатов фильтра/поиска/сортировки, ограниченный по памяти и сбрасываемый по номеру изменения
+
+import sys
+from array import array
+from collections import OrderedDict
+
+# Сколько памяти отдавать под кэш по умолчанию (ключ настроек cache/result_mb)
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+
+def estimate_size(value):
+    """
+    Примерный объём результата в байтах: буферы — по длине,
+    множества id — вместе с самими int (они свои у каждого ответа БД).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, array):
+        return len(value) * value.itemsize
+    if isinstance(value, (set, frozenset)):
+        return sys.getsizeof(value) + 28 * len(value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """
+    Ключ — описание выборки (режим, запрос, сортировка, дата), значение — готовый результат.
+    generation — номер состояния данных (счётчик изменений репозитория, поколение модели):
+    пришёл другой — всё закэшированное устарело и выбрасывается целиком.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max(0, int(max_bytes))
+        self.generation = None
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check(self, generation):
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+
+    def get(self, key, generation=None):
+        self._check(generation)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, generation=None, size=None):
+        self._check(generation)
+        size = estimate_size(value) if size is None else int(size)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+        # Результат больше всего кэша не храним — он вытеснил бы всё остальное
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.bytes += size
+        self._evict()
+
+    def resize(self, max_bytes):
+        self.max_bytes = max(0, int(max_bytes))
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.bytes -= size
+
+    def stats(self):
+        return {"entries": len(self._entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,48 @@
+# Смена даты: в полночь, после сна и при переводе часов — сигнал со старой и новой датой
+
+import datetime
+from PyQt5 import QtCore
+
+# Как часто сверять дату: таймер до полуночи во сне стоит, а часы могут перевести вручную
+CHECK_MS = 60 * 1000
+
+
+def ms_to_midnight(now=None):
+    now = now or datetime.datetime.now()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return int((midnight - now).total_seconds() * 1000)
+
+
+class DateRollover(QtCore.QObject):
+    """
+    dateChanged(old, new) — сменилась локальная дата (обычно на день вперёд,
+    но после сна/перевода часов — на любое число дней в любую сторону).
+    """
+    dateChanged = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, parent=None, check_ms=CHECK_MS):
+        super().__init__(parent)
+        self.today = datetime.date.today()
+        self._midnight_timer = QtCore.QTimer(self)
+        self._midnight_timer.setSingleShot(True)
+        self._midnight_timer.timeout.connect(self.check)
+        self._check_timer = QtCore.QTimer(self)
+        self._check_timer.setInterval(int(check_ms))
+        self._check_timer.timeout.connect(self.check)
+        self._check_timer.start()
+        # Окно снова активно (в том числе после пробуждения) — сверяемся сразу
+        app = QtCore.QCoreApplication.instance()
+        if app is not None and hasattr(app, "applicationStateChanged"):
+            app.applicationStateChanged.connect(lambda state: self.check())
+        self._arm()
+
+    def _arm(self):
+        # Небольшой запас: таймер может сработать чуть раньше, а дата должна уже смениться
+        self._midnight_timer.start(ms_to_midnight() + 1000)
+
+    def check(self):
+        today = datetime.date.today()
+        if today != self.today:
+            old, self.today = self.today, today
+            self.dateChanged.emit(old, today)
+        self._arm()
@@ -0,0 +1,240 @@
+# Кэш строк блоками для очень больших досок: в памяти порядок id (array 'q') и LRU блоков строк в бюджете памяти
+
+import sys
+from array import array
+from collections import OrderedDict
+
+# Строк в блоке: один запрос к БД на блок, прокрутка экрана задевает один-два блока
+BLOCK_ROWS = 256
+# Сколько памяти отдавать под строки по умолчанию (ключ настроек db/row_cache_mb)
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+# Сколько блоков читать заранее по направлению прокрутки
+PREFETCH_BLOCKS = 2
+
+
+def row_size(row):
+    # Примерный объём строки-словаря вместе со значениями
+    if not isinstance(row, dict):
+        return sys.getsizeof(row)
+    return sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row.values())
+
+
+class BlockRowCache:
+    """
+    ids — id задач в порядке показа (полный список, по 8 байт на строку);
+    сами строки читаются блоками по block_rows через fetch(список id) -> список строк
+    (в том же порядке; None — БД сейчас недоступна, блок не кэшируется).
+    Блоки лежат в LRU и вытесняются по max_bytes; блок, который сейчас смотрят, не вытесняется.
+    on_move(номер блока) — прокрутка перешла в другой блок (повод прочитать следующие заранее).
+    """
+    def __init__(self, fetch, ids=None, block_rows=BLOCK_ROWS, max_bytes=DEFAULT_MAX_BYTES,
+                 prefetch_blocks=PREFETCH_BLOCKS):
+        self.fetch = fetch
+        self.block_rows = max(1, int(block_rows))
+        self.max_bytes = max(0, int(max_bytes))
+        self.prefetch_blocks = max(0, int(prefetch_blocks))
+        self.on_move = None
+        self.ids = array("q")
+        # Номер блока -> [строки, байты]
+        self._blocks = OrderedDict()
+        self.bytes = 0
+        self._current = None
+        # +1 — листают вниз, -1 — вверх
+        self.direction = 1
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.reset(ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def reset(self, ids=None):
+        # Новый порядок (перезагрузка, смена фильтра/сортировки): блоки от старого не годятся
+        self.ids = ids if isinstance(ids, array) else array("q", ids or ())
+        self.clear()
+
+    def clear(self):
+        self._blocks.clear()
+        self.bytes = 0
+        self._current = None
+
+    def resize(self, max_bytes):
+        self.max_bytes = max(0, int(max_bytes))
+        self._evict()
+
+    # ===== Чтение =====
+    def _load(self, block):
+        start = block * self.block_rows
+        ids = self.ids[start:start + self.block_rows].tolist()
+        if not ids:
+            return None
+        rows = self.fetch(ids)
+        if rows is None:
+            return None
+        rows = list(rows)
+        entry = [rows, sum(row_size(r) for r in rows)]
+        self._blocks[block] = entry
+        self.bytes += entry[1]
+        self._evict()
+        return entry
+
+    def row(self, pos):
+        """Строка по номеру (блок читается при промахе); None — нет такой строки или БД недоступна."""
+        if pos < 0 or pos >= len(self.ids):
+            return None
+        block = pos // self.block_rows
+        entry = self._blocks.get(block)
+        if entry is None:
+            self.misses += 1
+            if block != self._current:
+                self._move(block)
+            entry = self._load(block)
+            if entry is None:
+                return None
+        else:
+            self.hits += 1
+            self._blocks.move_to_end(block)
+            if block != self._current:
+                self._move(block)
+        return entry[0][pos - block * self.block_rows]
+
+    def _move(self, block):
+        if self._current is not None and block != self._current:
+            self.direction = 1 if block > self._current else -1
+        self._current = block
+        if self.on_move is not None:
+            self.on_move(block)
+
+    def cached_row(self, pos):
+        # Строка, только если её блок уже в памяти (без чтения БД и без учёта в LRU)
+        if pos < 0 or pos >= len(self.ids):
+            return None
+        block = pos // self.block_rows
+        entry = self._blocks.get(block)
+        return entry[0][pos - block * self.block_rows] if entry is not None else None
+
+    def cached_rows(self):
+        for rows, _ in self._blocks.values():
+            yield from rows
+
+    def set_row(self, pos, row):
+        # Новая версия строки: в кэше — заменяем, иначе её прочитают с блоком
+        block = pos // self.block_rows
+        entry = self._blocks.get(block)
+        if entry is None or pos < 0 or pos >= len(self.ids):
+            return
+        i = pos - block * self.block_rows
+        delta = row_size(row) - row_size(entry[0][i])
+        entry[0][i] = row
+        entry[1] += delta
+        self.bytes += delta
+        self._evict()
+
+    def remeasure(self, positions):
+        # Строки дополнились на месте (догруженные колонки) — пересчитать объём их блоков
+        for block in {pos // self.block_rows for pos in positions}:
+            entry = self._blocks.get(block)
+            if entry is None:
+                continue
+            size = sum(row_size(r) for r in entry[0])
+            self.bytes += size - entry[1]
+            entry[1] = size
+        self._evict()
+
+    def delete(self, pos):
+        # Убрать строку из порядка; блоки с этого места и дальше сдвинулись — выбрасываем
+        if pos < 0 or pos >= len(self.ids):
+            return
+        del self.ids[pos]
+        first = pos // self.block_rows
+        for block in [b for b in self._blocks if b >= first]:
+            self.bytes -= self._blocks.pop(block)[1]
+
+    # ===== Поиск по id =====
+    def positions_of(self, task_ids):
+        """
+        id -> номер строки. Пара id — поиском в массиве (цикл на C),
+        больше — одним проходом по всему порядку.
+        """
+        wanted = set(task_ids or ())
+        if not wanted:
+            return {}
+        ids = self.ids
+        if len(wanted) <= 8:
+            found = {}
+            for task_id in wanted:
+                try:
+                    found[task_id] = ids.index(task_id)
+                except (ValueError, TypeError, OverflowError):
+                    pass
+            return found
+        return {t: i for i, t in enumerate(ids) if t in wanted}
+
+    # ===== Чтение заранее =====
+    def prefetch_targets(self, ahead=None):
+        # Блоки впереди по направлению прокрутки, которых ещё нет в памяти
+        if self._current is None:
+            return []
+        ahead = self.prefetch_blocks if ahead is None else ahead
+        last = (len(self.ids) - 1) // self.block_rows
+        targets = []
+        for step in range(1, ahead + 1):
+            block = self._current + step * self.direction
+            if block < 0 or block > last:
+                break
+            if block not in self._blocks:
+                targets.append(block)
+        return targets
+
+    def prefetch(self, ahead=None):
+        loaded = 0
+        for block in self.prefetch_targets(ahead):
+            if self._load(block) is None:
+                break
+            loaded += 1
+        self.prefetched += loaded
+        return loaded
+
+    # ===== Бюджет памяти =====
+    def _evict(self):
+        blocks = self._blocks
+        while self.bytes > self.max_bytes and len(blocks) > 1:
+            block = next(iter(blocks))
+            if block == self._current:
+                # Видимый блок не трогаем — он просто становится самым свежим
+                blocks.move_to_end(block)
+                block = next(iter(blocks))
+            self.bytes -= blocks.pop(block)[1]
+
+    def stats(self):
+        return {"rows": len(self.ids), "index_bytes": len(self.ids) * self.ids.itemsize,
+                "blocks": len(self._blocks), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "prefetched": self.prefetched}
+
+
+class LazyRows:
+    """
+    Список строк модели поверх BlockRowCache: len — без чтения, [pos] — через кэш блоков.
+    Обхода целиком нет намеренно — он прочитал бы всю таблицу.
+    """
+    __slots__ = ("cache",)
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __len__(self):
+        return len(self.cache.ids)
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += len(self.cache.ids)
+        if pos < 0 or pos >= len(self.cache.ids):
+            raise IndexError(pos)
+        return self.cache.row(pos)
+
+    def __setitem__(self, pos, row):
+        self.cache.set_row(pos, row)
+
+    def __iter__(self):
+        raise TypeError("LazyRows: обход всех строк не поддерживается, используйте позиции")
@@ -0,0 +1,86 @@
+# Триграммный индекс в памяти: поиск подстроки (в том числе середины слова) без полного перебора
+
+from array import array
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """
+    Триграмма -> массив id задач (array 'q', компактнее списка int).
+    Сами тексты индекс не хранит (они есть у модели и в БД): кандидатов проверяет
+    verify(множество id, запрос) -> множество id, чьи тексты действительно содержат запрос.
+    Тексты подаются уже свёрнутыми (fold_key) — поиск ждёт свёрнутый запрос.
+    Запрос короче трёх символов индексом не решается: search() вернёт None.
+
+    Удаление и замена текста не вычищают списки (это проход по каждому): id просто
+    перестаёт быть живым, а старые записи становятся мусором — лишними кандидатами,
+    которые отсеет verify. Когда мусора больше, чем живых записей, stale() == True
+    и индекс пора построить заново.
+    """
+    def __init__(self, verify):
+        self.verify = verify
+        self._postings = {}
+        # id -> хэш текста: повторная запись того же текста ничего не добавляет
+        self._live = {}
+        self._garbage = 0
+
+    def __len__(self):
+        return len(self._live)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._live
+
+    def clear(self):
+        self._postings.clear()
+        self._live.clear()
+        self._garbage = 0
+
+    def add(self, doc_id, text):
+        text = text or ""
+        sig = hash(text)
+        old = self._live.get(doc_id)
+        if old == sig:
+            return
+        if old is not None:
+            self._garbage += 1
+        self._live[doc_id] = sig
+        postings = self._postings
+        for g in trigrams(text):
+            arr = postings.get(g)
+            if arr is None:
+                postings[g] = array("q", (doc_id,))
+            else:
+                arr.append(doc_id)
+
+    # Замена текста — та же запись: старые триграммы остаются мусором
+    update = add
+
+    def remove(self, doc_id):
+        if self._live.pop(doc_id, None) is not None:
+            self._garbage += 1
+
+    def stale(self):
+        # Мусора (удалённых и заменённых документов) больше, чем живых
+        return self._garbage > max(len(self._live), 1000)
+
+    def search(self, query):
+        """
+        Множество id, чьи тексты содержат query. Кандидаты — самый короткий
+        список среди триграмм запроса (только живые id); подстроку проверяет verify
+        (пересекать длинные списки дороже, чем проверить кандидатов).
+        """
+        if len(query) < 3:
+            return None
+        shortest = None
+        for g in trigrams(query):
+            arr = self._postings.get(g)
+            if arr is None:
+                return set()
+            if shortest is None or len(arr) < len(shortest):
+                shortest = arr
+        live = self._live
+        candidates = {d for d in shortest if d in live}
+        return set(self.verify(candidates, query)) if candidates else set()
@@ -1,12 +1,25 @@
 import sys, os
+import datetime
 from pathlib import Path
 from PyQt5 import QtCore, QtGui, QtWidgets, QtSvg
-import datetime
 
-from app.models import TaskTableModel
+from app.models import TaskTableModel, WindowedTaskModel
 from app.dialogs import TaskDialog
 from app.theme import enable_dark_theme, enable_light_theme
 from app.dialogs import HelpDialog
+from app.cli import parse_command, apply_command, CommandError
+from app.repo import ConflictError
+from app.pool import DatabaseBusyError
+from app.archiver import Archiver, DEFAULT_ARCHIVE_DAYS
+from app.maintenance import MaintenanceScheduler
+from app.backup_runner import BackupRunner, BACKUP_KEEP
+from app.write_queue import WriteBehindQueue, DEFAULT_FLUSH_MS
+from app.change_bus import ChangeBus
+from app.index_proxy import IndexedFilterProxy, MODES
+from app.query import compile_query, is_structured, QueryError, MODE_QUERIES
+from app.result_cache import ResultCache, DEFAULT_MAX_BYTES
+from app.row_cache import DEFAULT_MAX_BYTES as ROW_CACHE_MAX_BYTES
+from app.rollover import DateRollover
 
 
 try:
@@ -28,83 +41,6 @@ def resource_path(rel_path: str) -> str:
     return str((base_path / rel_path).resolve())
 
 
-class FilterProxy(QtCore.QSortFilterProxyModel):
-    def __init__(self, source_model=None, parent=None):
-        super().__init__(parent)
-        self._model = source_model
-        self.mode = "Все"
-        # Поиск регистронезависимый
-        self.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
-        # Автообновление при изменении данных/сортировки
-        self.setDynamicSortFilter(True)
-        if source_model is not None:
-            super().setSourceModel(source_model)
-
-    def setSourceModel(self, model):
-        super().setSourceModel(model)
-        self._model = model
-
-    def setMode(self, mode: str):
-        if self.mode != mode:
-            self.mode = mode
-            self.invalidateFilter()
-
-    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
-        if orientation == QtCore.Qt.Vertical:
-            if role == QtCore.Qt.DisplayRole:
-                return str(section + 1)
-            if role == QtCore.Qt.TextAlignmentRole:
-                return int(QtCore.Qt.AlignCenter)
-        return super().headerData(section, orientation, role)
-
-    def filterAcceptsRow(self, source_row, parent):
-        # 1) Строковый фильтр (поиск)
-        if not super().filterAcceptsRow(source_row, parent):
-            return False
-
-        # 2) Фильтр по режиму
-        try:
-            rows = getattr(self._model, "rows", None)
-            if rows is None or source_row < 0 or source_row >= len(rows):
-                return True
-            r = rows[source_row]
-        except Exception:
-            return True
-
-        # Поддержка dict и tuple
-        if isinstance(r, dict):
-            completed = bool(r.get("completed"))
-            due = r.get("due_date") or r.get("due")
-        else:
-            # (id, title, description, due_date, created_at, completed, priority)
-            try:
-                completed = bool(r[5])
-                due = r[3]
-            except Exception:
-                completed = False
-                due = None
-
-        try:
-            due_date = datetime.date.fromisoformat(due) if due else None
-        except Exception:
-            due_date = None
-
-        today = datetime.date.today()
-        m = self.mode
-
-        if m == "Все":
-            return True
-        if m == "Открытые":
-            return not completed
-        if m == "Просроченные":
-            return (not completed) and (due_date is not None) and (due_date < today)
-        if m == "На сегодня":
-            return (not completed) and (due_date is not None) and (due_date == today)
-        if m == "Выполненные":
-            return completed
-        return True
-    
- 
 class TitleBar(QtWidgets.QWidget):
     height_hint = 36
 
@@ -336,6 +272,11 @@ class WrapDelegate(QtWidgets.QStyledItemDelegate):
 
 
 class MainWindow(QtWidgets.QMainWindow):
+    # Размер страницы при сортировке на стороне БД
+    SERVER_PAGE_SIZE = 500
+    # С какого числа задач таблица читает строки окнами из БД (ключ настроек db/windowed_min_rows)
+    WINDOWED_MIN_ROWS = 500000
+
     def __init__(self, repo, parent=None):
         super().__init__(parent)
         self.repo = repo
@@ -360,6 +301,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.refresh_act = QtWidgets.QAction("Обновить", self)
         self.act_help = QtWidgets.QAction("Справка", self)
         self.act_about = QtWidgets.QAction("О программе", self)
+        self.act_diag = QtWidgets.QAction("Диагностика БД", self)
 
         self.act_help.setShortcut("F1")
         self.add_act.setShortcut("F2")
@@ -371,8 +313,37 @@ class MainWindow(QtWidgets.QMainWindow):
         self.edit_act.triggered.connect(self.edit_task)
         self.del_act.triggered.connect(self.delete_task)
         self.refresh_act.triggered.connect(self.refresh)
+
+        # Архив старых выполненных задач
+        self.act_archive = QtWidgets.QAction("Архивировать старые выполненные", self)
+        self.act_archive.setCheckable(True)
+        self.act_archive.setChecked(self._to_bool(self.settings.value("archive_enabled", False)))
+        self.act_archive.toggled.connect(self.on_toggle_archive)
+        self.act_archive_in_done = QtWidgets.QAction("Выполненные: показывать архив", self)
+        self.act_archive_in_done.setCheckable(True)
+        self.act_archive_in_done.setChecked(self._to_bool(self.settings.value("archive_in_done", True)))
+        self.act_archive_in_done.toggled.connect(self.on_toggle_archive_in_done)
+
+        # Резервные копии БД (в фоне, только при изменениях)
+        self.act_backup = QtWidgets.QAction("Резервные копии", self)
+        self.act_backup.setCheckable(True)
+        self.act_backup.setChecked(self._to_bool(self.settings.value("backup_enabled", True)))
+        self.act_backup.toggled.connect(self.on_toggle_backup)
+
+        # Сортировка запросом к БД (для больших списков, с постраничной подгрузкой)
+        self.act_server_sort = QtWidgets.QAction("Сортировка в БД", self)
+        self.act_server_sort.setCheckable(True)
+        self.act_server_sort.setChecked(self._to_bool(self.settings.value("server_sort", False)))
+        self.act_server_sort.toggled.connect(self.on_toggle_server_sort)
+
+        # Сохранённые виды (запрос строки поиска + сортировка), хранятся в БД
+        self.act_save_view = QtWidgets.QAction("Сохранить вид...", self)
+        self.act_save_view.triggered.connect(self.save_view)
+        self.act_delete_view = QtWidgets.QAction("Удалить вид", self)
+        self.act_delete_view.triggered.connect(self.delete_view)
         self.act_help.triggered.connect(self.show_help)
         self.act_about.triggered.connect(self.show_about)
+        self.act_diag.triggered.connect(self.show_diagnostics)
 
         # Тема приложения
         self.act_dark = QtWidgets.QAction("Тёмная тема", self)
@@ -382,11 +353,35 @@ class MainWindow(QtWidgets.QMainWindow):
         self.act_dark.toggled.connect(self.on_toggle_theme)
 
         # ===== Модель и прокси =====
-        self.model = TaskTableModel(repo, self)
-        self.proxy = FilterProxy(self.model, self)
-        self.proxy.setSourceModel(self.model)
-        self.proxy.setFilterCaseSensitivity(QtCore.Qt.CaseInsensitive)
-        self.proxy.setDynamicSortFilter(True)
+        server_sort = self.act_server_sort.isChecked()
+        self.model = self._create_model(server_sort)
+        if self.model.windowed:
+            # Оконная модель сама сортирует в БД, а архив (UNION с другой БД) окнами не читает
+            server_sort = False
+            self.act_server_sort.setEnabled(False)
+            self.act_archive_in_done.setEnabled(False)
+        # Шина изменений: модель применяет события репозитория точечно, без refresh()
+        self.bus = ChangeBus(repo, parent=self)
+        self.model.connect_bus(self.bus)
+        # Быстрые правки (отметка выполнения) пишутся пачкой, а не коммитом на каждое действие
+        try:
+            flush_ms = int(self.settings.value("write_behind_ms", DEFAULT_FLUSH_MS))
+        except Exception:
+            flush_ms = DEFAULT_FLUSH_MS
+        self.write_queue = WriteBehindQueue(repo, flush_ms=flush_ms, parent=self)
+        self.write_queue.flushed.connect(self.model.set_versions)
+        self.write_queue.conflicted.connect(self._on_writes_conflicted)
+        self.write_queue.failed.connect(self._on_writes_failed)
+        # Фильтр/сортировка на готовых индексах (битовые множества режимов + перестановки колонок)
+        self.proxy = IndexedFilterProxy(self.model, self)
+        self.proxy.setServerSort(server_sort)
+        # Кэш готовых выборок: cache/result_mb на всё (три четверти — прокси, остальное — ответы БД на запросы)
+        try:
+            cache_bytes = int(float(self.settings.value("cache/result_mb", DEFAULT_MAX_BYTES / 2 ** 20)) * 2 ** 20)
+        except Exception:
+            cache_bytes = DEFAULT_MAX_BYTES
+        self.proxy.result_cache.resize(cache_bytes * 3 // 4)
+        self._query_cache = ResultCache(cache_bytes // 4)
 
         # ===== Вид (таблица) =====
         self.view = QtWidgets.QTableView()
@@ -408,8 +403,28 @@ class MainWindow(QtWidgets.QMainWindow):
         hdr.setSectionResizeMode(QtWidgets.QHeaderView.Interactive)
 
         vhdr = self.view.verticalHeader()
-        vhdr.setSectionResizeMode(QtWidgets.QHeaderView.ResizeToContents)
+        # Высота по содержимому для всей таблицы (ResizeToContents) спросила бы data() у каждой строки
+        # и догрузила бы все описания: высота по умолчанию — по шрифту, подгоняются только строки на экране
+        if self.model.windowed:
+            vhdr.setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        else:
+            vhdr.setSectionResizeMode(QtWidgets.QHeaderView.Interactive)
         vhdr.setDefaultAlignment(QtCore.Qt.AlignCenter)
+        self._rows_timer = QtCore.QTimer(self)
+        self._rows_timer.setSingleShot(True)
+        self._rows_timer.setInterval(0)
+        self._rows_timer.timeout.connect(self._resize_visible_rows)
+        if not self.model.windowed:
+            # Прокрутка, новый размер окна, новая выборка — на экране другие строки
+            sb = self.view.verticalScrollBar()
+            sb.valueChanged.connect(lambda value: self._rows_timer.start())
+            sb.rangeChanged.connect(lambda lo, hi: self._rows_timer.start())
+            self.proxy.modelReset.connect(self._rows_timer.start)
+            self.proxy.layoutChanged.connect(self._rows_timer.start)
+            self.proxy.rowsInserted.connect(lambda parent, first, last: self._rows_timer.start())
+
+        # Описание догружается лениво — после прихода пересчитываем высоту этих строк
+        self.model.rowsFilled.connect(self._resize_source_rows)
 
         # Делегат для "Описание" (если такая колонка есть)
         self.desc_col = getattr(self.model, "column_index", lambda k: -1)("description")
@@ -418,12 +433,17 @@ class MainWindow(QtWidgets.QMainWindow):
 
         # Верхняя панель (поиск + фильтр)
         self.search_edit = QtWidgets.QLineEdit()
-        self.search_edit.setPlaceholderText("Поиск по названию...")
+        self.search_edit.setPlaceholderText("Поиск по названию и описанию... или запрос: due<today prio>=5 done:no")
         self.search_edit.textChanged.connect(self.apply_search)
 
         self.filter_combo = QtWidgets.QComboBox()
-        self.filter_combo.addItems(["Все", "Открытые", "Просроченные", "На сегодня", "Выполненные"])
+        for mode in MODES:
+            self.filter_combo.addItem(mode, mode)
+        # Ключ режима ("view:<id>") -> сохранённый вид из БД
+        self._saved_views = {}
+        self._reload_views()
         self.filter_combo.currentIndexChanged.connect(self.apply_filter)
+        self.proxy.countsChanged.connect(self._update_view_counts)
 
         top = QtWidgets.QHBoxLayout()
         top.addWidget(self.search_edit)
@@ -459,14 +479,24 @@ class MainWindow(QtWidgets.QMainWindow):
         self.main_menu.addSeparator()
         self.main_menu.addAction(font_action)
         self.main_menu.addAction(self.refresh_act)
+        self.main_menu.addAction(self.act_server_sort)
+        self.main_menu.addAction(self.act_archive)
+        self.main_menu.addAction(self.act_archive_in_done)
+        self.main_menu.addAction(self.act_backup)
         self.main_menu.addSeparator()
 
+        # Подменю "Виды"
+        self.views_menu = self.main_menu.addMenu("Виды")
+        self.views_menu.addAction(self.act_save_view)
+        self.views_menu.addAction(self.act_delete_view)
+
         # Подменю "Столбцы"
         self.columns_menu = self.main_menu.addMenu("Столбцы")
         self._column_actions = {}
 
         self.main_menu.addSeparator()
         self.main_menu.addAction(self.act_help)
+        self.main_menu.addAction(self.act_diag)
         self.main_menu.addSeparator()
         self.main_menu.addAction(self.act_about)
 
@@ -506,14 +536,14 @@ class MainWindow(QtWidgets.QMainWindow):
         last_query = self.settings.value("search_query", "")
         self.search_edit.setText(str(last_query))
         last_filter = str(self.settings.value("filter_mode", "Все"))
-        ix = self.filter_combo.findText(last_filter)
+        ix = self.filter_combo.findData(last_filter)
         if ix >= 0:
             self.filter_combo.setCurrentIndex(ix)
         self.apply_search(self.search_edit.text())
         self.apply_filter()
 
         # Пересчёт высоты строк
-        self.view.resizeRowsToContents()
+        self._resize_all_rows()
 
         # Применение темы
         app = QtWidgets.QApplication.instance()
@@ -525,10 +555,67 @@ class MainWindow(QtWidgets.QMainWindow):
                     enable_light_theme(app)
             except Exception:
                 pass
+            self.model.set_palette(app.palette())
 
         # Отложенное восстановление: порядок/сортировка из saveState, затем ширины и видимость
         QtCore.QTimer.singleShot(0, self._initial_restore)
 
+        # Архивация — в фоне, пачками: вскоре после старта и затем раз в 6 часов
+        try:
+            days = int(self.settings.value("archive_days", DEFAULT_ARCHIVE_DAYS))
+        except Exception:
+            days = DEFAULT_ARCHIVE_DAYS
+        self.archiver = Archiver(self.repo, days=days, parent=self)
+        self.archiver.finished.connect(self._on_archive_finished)
+        self._archive_timer = QtCore.QTimer(self)
+        self._archive_timer.setInterval(6 * 60 * 60 * 1000)
+        self._archive_timer.timeout.connect(self._run_archiver)
+        if self.act_archive.isChecked():
+            self._archive_timer.start()
+            QtCore.QTimer.singleShot(10000, self._run_archiver)
+        app = QtWidgets.QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.archiver.stop)
+
+        # Резервное копирование — через минуту после старта и затем раз в час;
+        # пока БД не менялась с прошлой копии, ничего не делает
+        try:
+            keep = int(self.settings.value("backup_keep", BACKUP_KEEP))
+        except Exception:
+            keep = BACKUP_KEEP
+        self.backup_runner = BackupRunner(self.repo, keep=keep, parent=self)
+        self._backup_timer = QtCore.QTimer(self)
+        self._backup_timer.setInterval(60 * 60 * 1000)
+        self._backup_timer.timeout.connect(self._run_backup)
+        if self.act_backup.isChecked():
+            self._backup_timer.start()
+            QtCore.QTimer.singleShot(60000, self._run_backup)
+        if app is not None:
+            app.aboutToQuit.connect(self.backup_runner.wait)
+
+        # Обслуживание БД (optimize/checkpoint/vacuum) — при бездействии и на выходе
+        self.maintenance = MaintenanceScheduler(self.repo, self.settings, parent=self)
+
+        # Изменения из других процессов (шина опрашивает PRAGMA data_version) и высота строк
+        self.bus.set_sync(self._on_external_changes)
+        self.bus.taskInserted.connect(self._resize_task_row)
+        self.bus.taskUpdated.connect(lambda task_id, fields: self._resize_task_row(task_id))
+
+        # Строка состояния: открытые / просроченные / на сегодня / выполненные — из агрегатов БД
+        self.counts_label = QtWidgets.QLabel()
+        self.statusBar().addPermanentWidget(self.counts_label)
+        self._counts_timer = QtCore.QTimer(self)
+        self._counts_timer.setSingleShot(True)
+        self._counts_timer.setInterval(100)
+        self._counts_timer.timeout.connect(self._refresh_counts)
+        # Пачка изменений — один запрос
+        self.bus.changed.connect(lambda event: self._counts_timer.start())
+        self._refresh_counts()
+
+        # Смена даты (полночь, выход из сна, перевод часов): раскраска, фильтры и счётчики — точечно
+        self.rollover = DateRollover(self)
+        self.rollover.dateChanged.connect(self._on_date_changed)
+
     # для применения шрифта и метод смены шрифта
     def _apply_font_to_ui(self, f):
         # 1: определение метода, принимает self и QFont f
@@ -621,10 +708,10 @@ class MainWindow(QtWidgets.QMainWindow):
             if getattr(self, "view", None):  # 41: если у объекта есть атрибут view (например, QTableView)
                 try:
                     self.view.viewport().update()  # 42: обновляем содержимое области просмотра таблицы
-                    self.view.resizeRowsToContents()  # 43: пересчитываем высоты строк (если зависят от шрифта)
+                    self._resize_all_rows()  # 43: пересчитываем высоты строк (если зависят от шрифта)
                 except Exception:
                     pass  # 44: пропускаем ошибки при обновлении view
-            if getattr(self, "proxy", None):  # 35: если есть proxy (QSortFilterProxyModel)
+            if getattr(self, "proxy", None):  # 35: если есть proxy (фильтр/сортировка)
                 try:
                     self.proxy.invalidate()  # 46: инвалидируем прокси — он пересчитает фильтрацию/сортировку и обновит view
                 except Exception:
@@ -701,6 +788,42 @@ class MainWindow(QtWidgets.QMainWindow):
         # Синхронизируем меню "Столбцы"
         self._sync_column_checks()
 
+        # Проекция выборки — только видимые колонки
+        self._update_projection()
+
+    def _update_projection(self):
+        hdr = self.view.horizontalHeader()
+        keys = [k for c, (k, _) in enumerate(self.model.COLUMNS) if not hdr.isSectionHidden(c)]
+        self.model.set_columns(keys)
+
+    def _resize_all_rows(self):
+        # Высота по умолчанию — по шрифту; по содержимому — только строки на экране
+        # (у оконной модели высота постоянная)
+        self.view.verticalHeader().setDefaultSectionSize(self.view.fontMetrics().height() + 8)
+        if not self.model.windowed:
+            self._resize_visible_rows()
+
+    def _resize_visible_rows(self):
+        # Строки от верхнего до нижнего края окна; rowAt за последней строкой — -1
+        view = self.view
+        count = view.model().rowCount()
+        if self.model.windowed or count <= 0:
+            return
+        first = max(view.rowAt(0), 0)
+        last = view.rowAt(view.viewport().height() - 1)
+        if last < 0:
+            last = count - 1
+        for row in range(first, last + 1):
+            view.resizeRowToContents(row)
+
+    def _resize_source_rows(self, source_rows):
+        if self.model.windowed:
+            return
+        for pos in source_rows:
+            vrow = self.proxy.mapFromSource(self.model.index(pos, 0)).row()
+            if vrow >= 0:
+                self.view.resizeRowToContents(vrow)
+
     def _restore_columns_user_prefs(self):
         try:
             hdr = self.view.horizontalHeader()
@@ -745,27 +868,327 @@ class MainWindow(QtWidgets.QMainWindow):
             pass
         try:
             if isinstance(self.desc_col, int) and self.desc_col >= 0 and logicalIndex == self.desc_col:
-                self.view.resizeRowsToContents()
+                self._resize_all_rows()
         except Exception:
             pass
 
     # ===== Поиск/фильтр/обновление =====
     def apply_search(self, text):
-        col_title = getattr(self.model, "column_index", lambda k: 0)("title")
-        self.proxy.setFilterKeyColumn(col_title if isinstance(col_title, int) and col_title >= 0 else 0)
-        self.proxy.setFilterFixedString(text)
+        # "due<today prio>=5 done:no отчёт" — запрос (app/query.py), иначе обычный поиск подстроки
+        try:
+            plan = compile_query(text) if is_structured(text) else None
+        except QueryError as e:
+            # Запрос ещё набирается или с ошибкой — оставляем прежний фильтр
+            self.search_edit.setToolTip(str(e))
+            QtWidgets.QToolTip.showText(self.search_edit.mapToGlobal(self.search_edit.rect().bottomLeft()),
+                                        str(e), self.search_edit)
+            return
+        self.search_edit.setToolTip("\n".join(plan.warnings) if plan is not None else "")
+        paged = self.proxy.server_sort or self.model.include_archive or self.model.windowed
+        # При сортировке в БД в памяти лишь часть строк — поиск уходит в запрос
+        if paged and (self.model.title_search, self.model.query) != self._model_search(text, plan):
+            self.model.title_search, self.model.query = self._model_search(text, plan)
+            self.model.load()
+        if plan is None:
+            self.proxy.setSearch(text)
+        else:
+            self.proxy.setQuery(plan, None if paged else self._query_ids(plan))
         self.settings.setValue("search_query", text)
 
+    def _query_ids(self, plan):
+        # Ответ БД на запрос — из кэша, пока в репозитории ничего не менялось
+        key = (plan.text, datetime.date.today())
+        ids = self._query_cache.get(key, self.repo.change_counter)
+        if ids is None:
+            try:
+                ids = self.repo.query_ids(plan)
+            except Exception:
+                return None
+            self._query_cache.put(key, ids, self.repo.change_counter)
+        return ids
+
+    @staticmethod
+    def _model_search(text, plan):
+        # (title_search, query) для постраничной модели: запрос или подстрока названия
+        return (None, plan) if plan is not None else (text or None, None)
+
+    def _paged_search(self, paged):
+        if not paged:
+            return None, None
+        text = self.search_edit.text()
+        try:
+            plan = compile_query(text) if is_structured(text) else None
+        except QueryError:
+            plan = None
+        return self._model_search(text, plan)
+
+    def _current_mode(self):
+        # Ключ режима: название из MODES или "view:<id>" для сохранённого вида
+        return self.filter_combo.currentData() or MODES[0]
+
     def apply_filter(self):
-        mode = self.filter_combo.currentText()
+        mode = self._current_mode()
+        self._update_archive_mode(mode)
+        if self.model.windowed:
+            self._apply_windowed_mode(mode)
         self.proxy.setMode(mode)
         self.settings.setValue("filter_mode", mode)
+        self.act_delete_view.setEnabled(mode in self._saved_views)
+        view = self._saved_views.get(mode)
+        if view and view["sort_key"]:
+            # Сортировка вида — через заголовок (он и пересортирует таблицу)
+            col = self.model.column_index(view["sort_key"])
+            if col >= 0:
+                order = QtCore.Qt.DescendingOrder if view["sort_desc"] else QtCore.Qt.AscendingOrder
+                self.view.horizontalHeader().setSortIndicator(col, order)
+
+    def _mode_plan(self, mode):
+        # Режим или сохранённый вид запросом (Plan) — для оконной модели, где фильтрует БД
+        view = getattr(self, "_saved_views", {}).get(mode)
+        text = view["query"] if view else MODE_QUERIES.get(mode)
+        if not text:
+            return None
+        try:
+            return compile_query(text)
+        except QueryError:
+            return None
+
+    def _apply_windowed_mode(self, mode):
+        plan = self._mode_plan(mode)
+        current = self.model.mode_query
+        if (plan and plan.text) != (current and current.text):
+            self.model.mode_query = plan
+            self.model.load()
+
+    # ===== Сохранённые виды =====
+    def _reload_views(self, select=None):
+        """
+        Перечитывает виды из БД: пункты списка режимов и множества в прокси.
+        select — ключ режима, который выбрать (по умолчанию — текущий).
+        """
+        try:
+            rows = self.repo.list_views()
+        except Exception:
+            rows = []
+        views, plans = {}, []
+        for v in rows:
+            try:
+                plan = compile_query(v["query"])
+            except QueryError:
+                continue
+            key = f"view:{v['id']}"
+            views[key] = v
+            plans.append((key, plan))
+        current = select or self._current_mode()
+        combo = self.filter_combo
+        combo.blockSignals(True)
+        try:
+            while combo.count() > len(MODES):
+                combo.removeItem(combo.count() - 1)
+            if views:
+                combo.insertSeparator(len(MODES))
+            for key, v in views.items():
+                combo.addItem(v["name"], key)
+            ix = combo.findData(current)
+            combo.setCurrentIndex(ix if ix >= 0 else 0)
+        finally:
+            combo.blockSignals(False)
+        self._saved_views = views
+        self.proxy.setViews(plans)
+
+    def _update_view_counts(self):
+        # Живые счётчики у видов; при постраничной загрузке в памяти не все задачи — без чисел
+        paged = self.proxy.server_sort or self.model.include_archive
+        for i in range(len(MODES), self.filter_combo.count()):
+            view = self._saved_views.get(self.filter_combo.itemData(i))
+            if view is None:
+                continue
+            count = None if paged else self.proxy.count(self.filter_combo.itemData(i))
+            text = view["name"] if count is None else f"{view['name']} ({count})"
+            if self.filter_combo.itemText(i) != text:
+                self.filter_combo.setItemText(i, text)
+
+    def save_view(self):
+        query = self.search_edit.text().strip()
+        if not query:
+            QtWidgets.QMessageBox.information(
+                self, "Сохранить вид",
+                "Наберите в строке поиска запрос (например: due<today prio>=5 done:no) — он станет условием вида.")
+            return
+        current = self._saved_views.get(self._current_mode())
+        name, ok = QtWidgets.QInputDialog.getText(self, "Сохранить вид", "Название вида:",
+                                                  text=current["name"] if current else "")
+        name = (name or "").strip()
+        if not ok or not name:
+            return
+        hdr = self.view.horizontalHeader()
+        col = hdr.sortIndicatorSection()
+        sort_key = self.model.COLUMNS[col][0] if 0 <= col < len(self.model.COLUMNS) else ""
+        try:
+            view_id = self.repo.save_view(name, query, sort_key, hdr.sortIndicatorOrder() == QtCore.Qt.DescendingOrder)
+        except QueryError as e:
+            QtWidgets.QMessageBox.warning(self, "Сохранить вид", f"Запрос не подходит:\n{e}")
+            return
+        except DatabaseBusyError:
+            self._warn_busy()
+            return
+        # Условие теперь в виде — строку поиска освобождаем
+        self._reload_views(select=f"view:{view_id}")
+        self.search_edit.clear()
+        self.apply_filter()
+
+    def delete_view(self):
+        view = self._saved_views.get(self._current_mode())
+        if view is None:
+            return
+        if QtWidgets.QMessageBox.question(self, "Удалить вид", f"Удалить вид «{view['name']}»?") != \
+                QtWidgets.QMessageBox.Yes:
+            return
+        try:
+            self.repo.delete_view(view["id"])
+        except DatabaseBusyError:
+            self._warn_busy()
+            return
+        self._reload_views(select=MODES[0])
+        self.apply_filter()
+
+    # ===== Архив =====
+    def _update_archive_mode(self, mode):
+        # "Выполненные" с архивом — постраничная выборка из UNION-представления
+        want = mode == "Выполненные" and self.act_archive_in_done.isChecked()
+        if want == self.model.include_archive or self.model.windowed:
+            return
+        self.model.include_archive = want
+        paged = want or self.proxy.server_sort
+        self.model.page_size = self.SERVER_PAGE_SIZE if paged else None
+        self.model.title_search, self.model.query = self._paged_search(paged)
+        self.model.load()
+        self._resize_all_rows()
+
+    def on_toggle_archive_in_done(self, checked):
+        self.settings.setValue("archive_in_done", bool(checked))
+        self._update_archive_mode(self._current_mode())
+
+    def on_toggle_archive(self, checked):
+        self.settings.setValue("archive_enabled", bool(checked))
+        if checked:
+            self._archive_timer.start()
+            self._run_archiver()
+        else:
+            self._archive_timer.stop()
+            self.archiver.stop(timeout=0)
+
+    def on_toggle_backup(self, checked):
+        self.settings.setValue("backup_enabled", bool(checked))
+        if checked:
+            self._backup_timer.start()
+            self._run_backup()
+        else:
+            self._backup_timer.stop()
+
+    def _run_backup(self):
+        if self.act_backup.isChecked():
+            self.backup_runner.start()
+
+    def _run_archiver(self):
+        if self.act_archive.isChecked():
+            self.archiver.start()
+
+    def _on_archive_finished(self, total):
+        # Из основной таблицы строки убрала шина (как удалённые); в режиме с архивом они
+        # должны остаться видны — уже архивными, поэтому перечитываем выборку
+        if total and self.model.include_archive:
+            self.model.load()
+
+    @staticmethod
+    def _is_archived(task):
+        return isinstance(task, dict) and bool(task.get("archived"))
+
+    def _warn_archived(self):
+        QtWidgets.QMessageBox.information(self, "Архив", "Задача в архиве — изменить её нельзя.")
 
     def refresh(self):
+        # Перезагрузка читает БД — сначала допишем отложенные правки
+        self.write_queue.flush()
         self.model.load()
         self.apply_search(self.search_edit.text())
         self.apply_filter()
-        self.view.resizeRowsToContents()
+        self._resize_all_rows()
+
+    def _on_external_changes(self):
+        # Ошибку (например, БД занята) не глушим: шина не запомнит версию и повторит сверку
+        # Строки из журнала заменят модельные — отложенные правки не должны потеряться
+        self.write_queue.flush()
+        touched = self.model.sync_changes()
+        # Высоту пересчитываем только у затронутых строк
+        self._resize_source_rows(touched)
+
+    def _resize_task_row(self, task_id):
+        if self.model.windowed:
+            return
+        pos = self.model.row_of_task(task_id)
+        if pos >= 0:
+            self._resize_source_rows([pos])
+
+    # ===== Строка состояния =====
+    def _refresh_counts(self):
+        try:
+            c = self.repo.task_counts()
+        except Exception:
+            return
+        self.counts_label.setText(
+            f"Открытые: {c['open']}   Просроченные: {c['overdue']}   "
+            f"На сегодня: {c['today']}   Выполненные: {c['done']}")
+
+    def _on_date_changed(self, old, new):
+        """
+        Без перезагрузки: класс (просрочена/сегодня/вид с относительной датой) меняется только
+        у задач с датами между старой и новой (со сдвигами из запросов) — их берём по индексу
+        и перерисовываем только цвет; прокси переставит эти строки сам по dataChanged.
+        """
+        if self.model.windowed and any(
+                plan is not None and plan.relative_dates() for plan in (self.model.mode_query, self.model.query)):
+            # Условие режима/поиска с датой считает БД — порядок перечитываем целиком
+            self.proxy.setToday(new)
+            self.model.load()
+            self._refresh_counts()
+            return
+        lo, hi = min(old, new), max(old, new)
+        ranges = [(column, (lo + datetime.timedelta(days=days)).isoformat(),
+                   (hi + datetime.timedelta(days=days)).isoformat())
+                  for column, days in self.proxy.date_terms()]
+        try:
+            ids = self.repo.task_ids_in_date_ranges(ranges)
+        except Exception:
+            ids = None
+        self.proxy.setToday(new)
+        if ids is None:
+            # БД недоступна — пересчитываем всё в памяти
+            self.model.set_today(new)
+            self.proxy.invalidate()
+        else:
+            self.model.refresh_foreground(self.model.rows_of_tasks(ids), new)
+        self._refresh_counts()
+
+    # ===== Команды от второго экземпляра (IPC) =====
+    def handle_command(self, argv):
+        try:
+            cmd = parse_command(argv)
+        except CommandError as e:
+            QtWidgets.QMessageBox.warning(self, "Командная строка", f"Команда не выполнена:\n{e}")
+            return
+        except SystemExit:
+            # --help: argparse хочет завершить процесс — окну это не нужно
+            return
+        if cmd is None:
+            return
+        # Новая строка придёт в модель событием шины — без полной перезагрузки
+        try:
+            apply_command(self.repo, cmd)
+        except DatabaseBusyError:
+            self._warn_busy()
+        except Exception:
+            pass
 
     # ===== Действия с задачами =====
     def selected_task(self):
@@ -781,29 +1204,99 @@ class MainWindow(QtWidgets.QMainWindow):
         if dlg.exec_() == QtWidgets.QDialog.Accepted:
             title, desc, due, completed, priority = dlg.get_data()
             if title and due:
-                self.repo.add_task(title, desc, due, priority)
-                self.refresh()
+                try:
+                    self.repo.add_task(title, desc, due, priority)
+                except DatabaseBusyError:
+                    self._warn_busy()
 
     def edit_task(self):
+        # Отложенные правки — сначала в БД, иначе версия задачи окажется устаревшей
+        self.write_queue.flush()
         task = self.selected_task()
         if not task:
             return
+        if self._is_archived(task):
+            self._warn_archived()
+            return
+        # В строке таблицы может не быть описания (грузится лениво) — берём задачу целиком
+        task_id = task["id"] if isinstance(task, dict) else task[0]
+        task = self.repo.get_task(task_id) or task
+        version = task.get("version") if isinstance(task, dict) else None
         dlg = TaskDialog(self, task=task)
         if dlg.exec_() == QtWidgets.QDialog.Accepted:
             title, desc, due, completed, priority = dlg.get_data()
-            task_id = task["id"] if isinstance(task, dict) else task[0]
-            self.repo.update_task(task_id, title, desc, due, completed, priority)
-            self.refresh()
+            try:
+                try:
+                    self.repo.update_task(task_id, title, desc, due, completed, priority, expected_version=version)
+                except ConflictError as e:
+                    # Пока диалог был открыт, задачу изменили в другом окне/скрипте
+                    if e.current_version is not None and self._ask_overwrite():
+                        self.repo.update_task(task_id, title, desc, due, completed, priority)
+                    else:
+                        if e.current_version is None:
+                            self._warn_conflict(e)
+                        # Показываем актуальное состояние задачи (или убираем удалённую)
+                        self.model.reload_tasks([task_id])
+            except DatabaseBusyError:
+                self._warn_busy()
+
+    def _ask_overwrite(self):
+        res = QtWidgets.QMessageBox.question(
+            self, "Конфликт изменений",
+            "Задачу уже изменили в другом окне или программе.\n"
+            "Сохранить ваши изменения поверх? (Нет — показать актуальную версию)"
+        )
+        return res == QtWidgets.QMessageBox.Yes
+
+    def _on_writes_conflicted(self, conflicts):
+        # Правки по этим задачам не записаны — показываем их актуальное состояние
+        self.model.reload_tasks(list(conflicts))
+        self._warn_conflict(next(iter(conflicts.values())))
+
+    def _on_writes_failed(self, task_ids, message):
+        # Пачка откатилась целиком: возвращаем строки к состоянию БД
+        self.model.reload_tasks(task_ids)
+        if "locked" in message or "busy" in message:
+            self._warn_busy()
+        else:
+            QtWidgets.QMessageBox.warning(self, "Ошибка записи", f"Изменения не сохранены:\n{message}")
+
+    def _warn_busy(self):
+        # БД на общем диске занята другими дольше таймаута — ничего не записано
+        QtWidgets.QMessageBox.warning(
+            self, "База данных занята",
+            "База данных сейчас занята другим пользователем или программой.\n"
+            "Изменения не сохранены — попробуйте ещё раз через несколько секунд."
+        )
+
+    def _warn_conflict(self, e):
+        if e.current_version is None:
+            text = "Задача уже удалена в другом окне или программе."
+        else:
+            text = "Задачу уже изменили в другом окне или программе — список обновлён."
+        QtWidgets.QMessageBox.information(self, "Конфликт изменений", text)
 
     def delete_task(self):
+        # Отложенные правки — сначала в БД, иначе версия задачи окажется устаревшей
+        self.write_queue.flush()
         task = self.selected_task()
         if not task:
             return
+        if self._is_archived(task):
+            self._warn_archived()
+            return
         res = QtWidgets.QMessageBox.question(self, "Удаление", "Удалить выбранную задачу?")
         if res == QtWidgets.QMessageBox.Yes:
             task_id = task["id"] if isinstance(task, dict) else task[0]
-            self.repo.delete_task(task_id)
-            self.refresh()
+            version = task.get("version") if isinstance(task, dict) else None
+            try:
+                self.repo.delete_task(task_id, expected_version=version)
+            except ConflictError as e:
+                # Удаляем только то, что пользователь видел; изменённую задачу — не трогаем
+                self._warn_conflict(e)
+                self.model.reload_tasks([task_id])
+            except DatabaseBusyError:
+                self._warn_busy()
 
     # ===== Контекстное меню таблицы =====
     def show_context_menu(self, pos):
@@ -829,19 +1322,17 @@ class MainWindow(QtWidgets.QMainWindow):
             self._sync_column_checks()
             menu.addMenu(self.columns_menu)
 
-        if has_sel:
+        if has_sel and not self._is_archived(self.selected_task()):
             task = self.selected_task()
             completed = bool(task.get("completed") if isinstance(task, dict) else task[5])
             toggle_text = "Отметить выполненной" if not completed else "Снять отметку выполнения"
 
             def toggle_completed():
                 task_id = task["id"] if isinstance(task, dict) else task[0]
-                title = task.get("title") if isinstance(task, dict) else task[1]
-                desc = task.get("description") if isinstance(task, dict) else task[2]
-                due = task.get("due_date") if isinstance(task, dict) else task[3]
-                priority = task.get("priority") if isinstance(task, dict) else task[6]
-                self.repo.update_task(task_id, title, desc, due, not completed, priority)
-                self.refresh()
+                version = task.get("version") if isinstance(task, dict) else None
+                # Сразу в модели, в БД — пачкой через очередь отложенной записи
+                self.model.patch_task(task_id, {"completed": 0 if completed else 1})
+                self.write_queue.enqueue(task_id, {"completed": not completed}, version)
 
             menu.addSeparator()
             menu.addAction(toggle_text, toggle_completed)
@@ -883,6 +1374,7 @@ class MainWindow(QtWidgets.QMainWindow):
                     self.settings.sync()
                 except Exception:
                     pass
+                self._update_projection()
                 self._sync_column_checks()
                 self._save_header_state()
 
@@ -904,6 +1396,52 @@ class MainWindow(QtWidgets.QMainWindow):
             act.setChecked(vis)
             act.blockSignals(False)
 
+    # ===== Сортировка в БД =====
+    @staticmethod
+    def _to_bool(v):
+        if isinstance(v, bool):
+            return v
+        return str(v).lower() in ("1", "true", "t", "yes", "y", "on")
+
+    def _create_model(self, server_sort):
+        """
+        От db/windowed_min_rows задач — оконная модель: в памяти порядок id и блоки строк
+        в бюджете db/row_cache_mb; иначе обычная (все строки или страницы при сортировке в БД).
+        """
+        try:
+            min_rows = int(self.settings.value("db/windowed_min_rows", self.WINDOWED_MIN_ROWS))
+            windowed = self.repo.count_tasks() >= min_rows
+        except Exception:
+            windowed = False
+        if not windowed:
+            return TaskTableModel(self.repo, self, page_size=self.SERVER_PAGE_SIZE if server_sort else None)
+        try:
+            max_bytes = int(float(self.settings.value("db/row_cache_mb", ROW_CACHE_MAX_BYTES / 2 ** 20)) * 2 ** 20)
+        except Exception:
+            max_bytes = ROW_CACHE_MAX_BYTES
+        # Режим фильтра сразу в первой выборке — чтобы не читать порядок всех задач дважды
+        mode_query = self._mode_plan(str(self.settings.value("filter_mode", MODES[0])))
+        return WindowedTaskModel(self.repo, self, max_bytes=max_bytes, mode_query=mode_query)
+
+    def on_toggle_server_sort(self, checked):
+        self.settings.setValue("server_sort", bool(checked))
+        if self.model.windowed:
+            return
+        hdr = self.view.horizontalHeader()
+        col, order = hdr.sortIndicatorSection(), hdr.sortIndicatorOrder()
+        self.proxy.setServerSort(checked)
+        self.model.page_size = self.SERVER_PAGE_SIZE if (checked or self.model.include_archive) else None
+        self.model.title_search, self.model.query = self._paged_search(checked or self.model.include_archive)
+        if checked:
+            # Первая страница приходит уже отсортированной из БД
+            self.proxy.sort(col, order)
+        else:
+            # Обратно: всё в память, сортирует прокси
+            self.model.order_by = "due_date ASC, priority DESC, id DESC"
+            self.model.load()
+            self.proxy.sort(col, order)
+        self._resize_all_rows()
+
     # ===== Тема =====
     def on_toggle_theme(self, checked):
         app = QtWidgets.QApplication.instance()
@@ -918,10 +1456,14 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.settings.setValue("theme", "light")
         except Exception:
             pass
+        # Кисти раскраски — под новую палитру
+        self.model.set_palette(app.palette())
+        self.view.viewport().update()
 
     # ===== Служебное =====
     def closeEvent(self, e):
         try:
+            self.archiver.stop()
             self._save_header_state()
             try:
                 self.settings.setValue("win/geometry", self.saveGeometry())
@@ -958,6 +1500,20 @@ class MainWindow(QtWidgets.QMainWindow):
             "Автор: Бученков Игорь"
         )
 
+    def show_diagnostics(self):
+        # Параметры БД: профиль производительности и фактические PRAGMA
+        try:
+            info = self.repo.diagnostics()
+        except Exception as e:
+            QtWidgets.QMessageBox.warning(self, "Диагностика БД", f"Не удалось получить данные:\n{e}")
+            return
+        info.update({f"result_cache_{k}": v for k, v in self.proxy.result_cache.stats().items()})
+        info.update({f"query_cache_{k}": v for k, v in self._query_cache.stats().items()})
+        if self.model.windowed:
+            info.update({f"row_cache_{k}": v for k, v in self.model.cache.stats().items()})
+        lines = [f"{k}: {v}" for k, v in info.items()]
+        QtWidgets.QMessageBox.information(self, "Диагностика БД", "\n".join(lines))
+
     def show_help(self):
         text = (
             "Справка\n\n"
@@ -969,7 +1525,12 @@ class MainWindow(QtWidgets.QMainWindow):
             "   F3 — Редактировать выбранную,\n"
             "   F4 — Изменить стиль и размер шрифта,\n"
             "   F5 — Обновить список.\n"
-            "   Delete — Удалить выбранную задачу."
+            "   Delete — Удалить выбранную задачу.\n\n"
+            "Запросы в строке поиска (условия через пробел, все должны выполняться):\n"
+            "   due<today, due>=2025-01-31, due<=today+7 — срок (today, tomorrow, yesterday, today±N),\n"
+            "   prio>=5 — приоритет, done:no / done:yes — выполнение,\n"
+            "   created=today — дата создания, title:отч — название начинается с,\n"
+            "   \"отчёт\" или просто слово — подстрока в названии."
         )
         # если в MainWindow есть self.settings — передайте её, иначе можно None
         settings = getattr(self, "settings", None)
@@ -1065,6 +1626,22 @@ class FramelessWindow(QtWidgets.QWidget):
         self._geom_save_timer.setInterval(400)
         self._geom_save_timer.timeout.connect(self._save_window_geometry)
 
+    def on_instance_message(self, argv):
+        # Второй запуск передал свою командную строку: применяем и поднимаем окно
+        try:
+            self.content.handle_command(argv)
+        finally:
+            self.bring_to_front()
+
+    def bring_to_front(self):
+        if self.isMinimized():
+            # Снимаем только "свёрнуто" — максимизированное окно останется максимизированным
+            self.setWindowState((self.windowState() & ~QtCore.Qt.WindowMinimized) | QtCore.Qt.WindowActive)
+        if not self.isVisible():
+            self.show()
+        self.raise_()
+        self.activateWindow()
+
     def _save_window_geometry(self):
         try:
             self.settings.setValue("win/geometry", self.saveGeometry())
@@ -1203,6 +1780,14 @@ class FramelessWindow(QtWidgets.QWidget):
             )
         except Exception:
             pass
+        # Отложенные правки — в БД до закрытия
+        write_queue = getattr(self.content, "write_queue", None)
+        if write_queue is not None:
+            write_queue.flush()
+        # Выход — удобный момент для обслуживания БД (выполняется один раз)
+        maintenance = getattr(self.content, "maintenance", None)
+        if maintenance is not None:
+            maintenance.run_on_quit()
 
     def closeEvent(self, e):
         try:
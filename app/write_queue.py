@@ -0,0 +1,75 @@
+# Отложенная запись: быстрые правки из UI копятся, склеиваются по задаче и уходят одной транзакцией
+
+import logging
+from PyQt5 import QtCore
+
+log = logging.getLogger("planboard.write_queue")
+
+# Через сколько мс после первой правки пачка уходит в БД
+DEFAULT_FLUSH_MS = 300
+
+
+class WriteBehindQueue(QtCore.QObject):
+    """
+    enqueue() только запоминает правку (модель уже показывает новое значение);
+    flush() пишет всё накопленное одной транзакцией — по таймеру, перед
+    перезагрузкой списка и на выходе.
+    """
+    # {task_id: новая версия} — записанные задачи
+    flushed = QtCore.pyqtSignal(dict)
+    # {task_id: ConflictError} — задачи, изменённые кем-то ещё: правка не записана
+    conflicted = QtCore.pyqtSignal(dict)
+    # id задач и текст ошибки — пачка целиком откатилась
+    failed = QtCore.pyqtSignal(list, str)
+
+    def __init__(self, repo, flush_ms=DEFAULT_FLUSH_MS, parent=None):
+        super().__init__(parent)
+        self.repo = repo
+        # task_id -> [поля, ожидаемая версия]; поля более поздних правок перекрывают ранние
+        self._pending = {}
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(max(0, int(flush_ms)))
+        self._timer.timeout.connect(self.flush)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def is_pending(self, task_id):
+        return task_id in self._pending
+
+    def enqueue(self, task_id, fields, expected_version=None):
+        fields = {k: v for k, v in fields.items() if k in self.repo.UPDATABLE and v is not None}
+        if not fields:
+            return
+        entry = self._pending.get(task_id)
+        if entry is None:
+            # Ожидаемая версия — та, что была до первой из склеенных правок
+            self._pending[task_id] = [fields, expected_version]
+        else:
+            entry[0].update(fields)
+        # Таймер не перезапускаем: поток правок не должен откладывать запись бесконечно
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """
+        Пишет накопленное. True — очередь пуста (всё записано или отклонено конфликтом).
+        """
+        self._timer.stop()
+        if not self._pending:
+            return True
+        pending, self._pending = self._pending, {}
+        updates = [(task_id, fields, version) for task_id, (fields, version) in pending.items()]
+        try:
+            versions, conflicts = self.repo.apply_updates(updates)
+        except Exception as e:
+            # Транзакция откатилась: в БД ничего из пачки нет
+            log.warning("write-behind flush of %d tasks failed: %s", len(updates), e)
+            self.failed.emit(list(pending), str(e))
+            return False
+        if versions:
+            self.flushed.emit(versions)
+        if conflicts:
+            self.conflicted.emit(conflicts)
+        return True